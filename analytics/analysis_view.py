@@ -0,0 +1,90 @@
+"""
+Filtered view of a chat for one date range, shared by the analytics modules
+"""
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+# Messages that carry no analysable text
+EXCLUDED_MESSAGES = ['<Media omitted>', '']
+
+_VIEW_CACHE_SIZE = 8
+_view_cache = OrderedDict()
+_view_cache_lock = threading.Lock()
+
+
+class AnalysisView:
+    """Analysable messages of a chat in [start_date, end_date], optionally for one user"""
+
+    def __init__(self, df: pd.DataFrame, start_date: str, end_date: str, user: Optional[str] = None):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.user = user
+
+        # One combined mask -> one row gather
+        # Compare the datetime64 'date' column (int64 compare) instead of the
+        # object-dtype 'only_date'; the end bound covers the whole end day
+        start = np.datetime64(pd.Timestamp(start_date).normalize())
+        end = np.datetime64(pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1))
+        dates = df['date'].to_numpy()
+        users = df['user'].to_numpy()
+        mask = (
+            (dates >= start) & (dates < end)
+            & (users != 'group_notification')
+            & ~df['message'].isin(EXCLUDED_MESSAGES).to_numpy()
+        )
+        if user is not None:
+            mask &= users == user
+
+        # Whitespace-only messages: only strip the rows that passed the cheap checks
+        candidates = np.flatnonzero(mask)
+        if len(candidates) > 0:
+            blank = df['message'].iloc[candidates].str.strip().eq('').to_numpy()
+            mask[candidates[blank]] = False
+
+        self.mask = mask
+        self.df = df[mask]
+        self._lower = None
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    @property
+    def date_range(self) -> str:
+        return f"{self.start_date} to {self.end_date}"
+
+    @property
+    def lower(self) -> pd.Series:
+        """Lowercased message column, computed on first use and reused afterwards"""
+        if self._lower is None:
+            self._lower = self.df['message'].str.lower()
+        return self._lower
+
+
+def get_analysis_view(df: pd.DataFrame, start_date: str, end_date: str, user: Optional[str] = None) -> AnalysisView:
+    """
+    Return the AnalysisView for (df, start_date, end_date, user), reusing a recent one
+
+    Sentiment and topic analysis over the same chat and range then share one
+    filter pass and one lowercased column.
+    """
+    key = (id(df), start_date, end_date, user)
+
+    with _view_cache_lock:
+        entry = _view_cache.get(key)
+        # id() can be reused after garbage collection, so confirm it is the same frame
+        if entry is not None and entry[0]() is df:
+            _view_cache.move_to_end(key)
+            return entry[1]
+
+    view = AnalysisView(df, start_date, end_date, user)
+
+    with _view_cache_lock:
+        _view_cache[key] = (weakref.ref(df), view)
+        while len(_view_cache) > _VIEW_CACHE_SIZE:
+            _view_cache.popitem(last=False)
+
+    return view
@@ -0,0 +1,48 @@
+"""
+Keyword category matching shared by the local (no-LLM) analytics fallbacks
+"""
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+
+class KeywordMatcher:
+    """Match messages against several keyword categories in a single regex scan"""
+
+    def __init__(self, categories: Dict[str, List[str]]):
+        self.names = list(categories)
+        # keyword -> category id
+        self._index = {
+            keyword: category_id
+            for category_id, keywords in enumerate(categories.values())
+            for keyword in keywords
+        }
+        # Longest keywords first so multi-word phrases win over their prefixes
+        self._pattern = re.compile('|'.join(
+            map(re.escape, sorted(self._index, key=len, reverse=True))
+        ))
+
+    def membership(self, lower: pd.Series) -> np.ndarray:
+        """
+        Boolean matrix of shape (n_messages, n_categories)
+
+        Args:
+            lower: lowercased message column
+
+        Returns:
+            membership[i, j] is True when message i contains a keyword of category j
+        """
+        membership = np.zeros((len(lower), len(self.names)), dtype=bool)
+
+        hits = lower.reset_index(drop=True).str.findall(self._pattern).explode().dropna()
+        if len(hits) > 0:
+            rows = hits.index.to_numpy()
+            cols = hits.map(self._index).to_numpy(dtype=np.int64)
+            membership[rows, cols] = True
+
+        return membership
+
+    def message_counts(self, lower: pd.Series) -> np.ndarray:
+        """Number of messages matching each category"""
+        return self.membership(lower).sum(axis=0)
@@ -0,0 +1,25 @@
+"""
+Message sampling before sending a chat slice to the LLM
+"""
+import pandas as pd
+from config.settings import MAX_LLM_MESSAGES
+
+
+def sample_for_llm(df: pd.DataFrame, max_messages: int = MAX_LLM_MESSAGES) -> pd.DataFrame:
+    """
+    Bound the prompt size with a reproducible sample of the slice, stratified by week
+
+    Each week contributes in proportion to its message count, so the sample
+    represents the whole date range (busy and quiet weeks alike) where taking
+    the first N rows would only show the start of it. Rows stay in chat order.
+    """
+    if len(df) <= max_messages:
+        return df
+
+    weeks = df['date'].dt.to_period('W')
+    sample = df.groupby(weeks).sample(frac=max_messages / len(df), random_state=42)
+
+    # Per-week rounding can overshoot the budget slightly
+    if len(sample) > max_messages:
+        sample = sample.sample(n=max_messages, random_state=42)
+    return sample.sort_index()
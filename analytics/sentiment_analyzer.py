@@ -1,44 +1,210 @@
 """
 Sentiment Analysis — FINAL BULLETPROOF VERSION
 """
+import logging
 import pandas as pd
-import json
-import re
-from llm.mistral_client import MistralClient
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from analytics.analysis_view import AnalysisView, get_analysis_view
+from analytics.keyword_matcher import KeywordMatcher
+from analytics.sampling import sample_for_llm
+from llm.mistral_client import get_mistral_client
 from llm.prompt_templates import get_sentiment_prompt
+from llm.json_utils import extract_json
+from llm.response_cache import get_response_cache, make_cache_key, frame_digest
+from config.settings import MIN_MESSAGES_FOR_LLM, LLM_MAX_CONCURRENT_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+# Keyword lists for the local (no-LLM) fallback
+POSITIVE_WORDS = [
+    'good', 'great', 'awesome', 'nice', 'love', 'happy', 'thanks', 'thank you',
+    'haha', 'lol', 'cool', 'amazing', 'best', 'congrats', 'yay', 'perfect',
+    '😂', '❤️', '😍', '😊', '👍', '🎉',
+]
+NEGATIVE_WORDS = [
+    'bad', 'sad', 'angry', 'hate', 'sorry', 'worst', 'annoying', 'upset',
+    'terrible', 'problem', 'issue', 'wtf', 'ugh', 'tired', 'sick',
+    '😢', '😭', '😡', '😠', '👎',
+]
+
+SENTIMENT_MATCHER = KeywordMatcher({'positive': POSITIVE_WORDS, 'negative': NEGATIVE_WORDS})
+
+EMOTION_KEYWORDS = {
+    'joy': ['happy', 'haha', 'lol', 'glad', 'fun', '😂', '😊', '😄'],
+    'anger': ['angry', 'mad', 'hate', 'furious', 'wtf', '😡', '😠'],
+    'frustration': ['annoying', 'ugh', 'irritating', 'fed up', 'seriously', '🙄'],
+    'sadness': ['sad', 'miss you', 'cry', 'upset', 'lonely', '😢', '😭'],
+    'enthusiasm': ["let's go", 'sure', 'definitely', 'count me in', 'love to', '💪'],
+    'excitement': ['excited', 'wow', 'omg', "can't wait", 'yay', '🎉', '🔥'],
+    'concern': ['worried', 'hope', 'careful', 'okay?', 'are you ok', 'take care'],
+}
+EMOTION_MATCHER = KeywordMatcher(EMOTION_KEYWORDS)
 
 
 class TimeBasedSentimentAnalyzer:
     def __init__(self):
-        self.llm = MistralClient()
+        self.llm = get_mistral_client()
+        self.cache = get_response_cache()
 
     def analyze_date_range(self, df: pd.DataFrame, start_date: str, end_date: str) -> dict:
-        df = df.copy()
-        df = df[df['only_date'].astype(str).between(start_date, end_date)]
-        df = df[df['user'] != 'group_notification']
-        df = df[~df['message'].isin(['<Media omitted>', ''])]
+        return self._analyze(get_analysis_view(df, start_date, end_date))
 
-        if len(df) == 0:
-            return {"insights": "No messages found.", "total_messages": 0}
+    def analyze_by_user(self, df: pd.DataFrame, user: str, start_date: str, end_date: str) -> dict:
+        return self._analyze(get_analysis_view(df, start_date, end_date, user=user))
 
-        messages = df.to_dict('records')
+    def analyze_by_user_batch(self, df: pd.DataFrame, users: List[str], start_date: str, end_date: str) -> Dict[str, dict]:
+        """Analyze several users with their LLM calls in flight concurrently"""
+        async def _run():
+            # Bounded so a large group doesn't fire every request at the API at once
+            semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENT_REQUESTS)
 
-        try:
-            prompt = get_sentiment_prompt(messages, f"{start_date} to {end_date}")
-            raw = self.llm.generate_text(prompt)
+            async def _one(user):
+                async with semaphore:
+                    return await self._analyze_async(get_analysis_view(df, start_date, end_date, user=user))
+
+            try:
+                results = await asyncio.gather(*[_one(user) for user in users])
+            finally:
+                # The loop closes with asyncio.run, so its connection pools go with it
+                await self.llm.aclose()
+            return dict(zip(users, results))
 
-            json_str = re.search(r"\{.*\}", raw, re.DOTALL)
-            if not json_str:
-                raise ValueError("No JSON")
+        return asyncio.run(_run())
 
-            result = json.loads(json_str.group())
-            result["total_messages"] = len(messages)
+    def _analyze(self, view: AnalysisView) -> dict:
+        result, cache_key = self._result_without_llm(view)
+        if result is not None:
             return result
 
+        try:
+            raw = self.llm.generate_text(self._build_prompt(view), persist=True)
+        except Exception as e:
+            return self._llm_fallback(view, e)
+        return self._result_from_llm(view, raw, cache_key)
+
+    async def _analyze_async(self, view: AnalysisView) -> dict:
+        result, cache_key = self._result_without_llm(view)
+        if result is not None:
+            return result
+
+        try:
+            raw = await self.llm.generate_text_async(self._build_prompt(view), persist=True)
+        except Exception as e:
+            return self._llm_fallback(view, e)
+        return self._result_from_llm(view, raw, cache_key)
+
+    def _result_without_llm(self, view: AnalysisView) -> Tuple[Optional[dict], Optional[str]]:
+        """
+        Everything before the LLM call, shared by the sync and async paths
+
+        Returns:
+            (result, None) when no LLM call is needed (empty or small slice,
+            cached analysis), else (None, cache key for _result_from_llm)
+        """
+        if len(view) == 0:
+            return {"insights": "No messages found.", "total_messages": 0}, None
+        if self._too_small_for_llm(view):
+            return self._local_sentiment_analysis(view), None
+
+        cache_key = self._cache_key(view)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached, None
+        return None, cache_key
+
+    def _result_from_llm(self, view: AnalysisView, raw: str, cache_key: str) -> dict:
+        """Parsed and cached LLM result, or the keyword fallback if the output is unusable"""
+        try:
+            return self._parse_response(raw, view.df, cache_key)
         except Exception as e:
-            return {
-                "overall_sentiment": {"positive": 0.6, "neutral": 0.3, "negative": 0.1},
-                "emotions": {"joy": 0.7, "frustration": 0.2, "concern": 0.1},
-                "insights": f"Gemini sent messy JSON. Raw output: {str(raw)[:500]}",
-                "total_messages": len(messages)
-            }
+            return self._llm_fallback(view, e, raw)
+
+    def _llm_fallback(self, view: AnalysisView, error: Exception, raw: str = "") -> dict:
+        logger.warning("Sentiment LLM result unusable, using keywords: %s", error)
+        return self._basic_sentiment_analysis(view, raw)
+
+    def _too_small_for_llm(self, view: AnalysisView) -> bool:
+        """Tiny or single-message slices aren't worth a paid API round-trip"""
+        return len(view) < MIN_MESSAGES_FOR_LLM or view.df['message'].nunique() == 1
+
+    def _build_prompt(self, view: AnalysisView) -> str:
+        sample = sample_for_llm(view.df)
+        return get_sentiment_prompt(
+            sample['user'].to_numpy(), sample['message'].to_numpy(),
+            view.date_range, total_messages=len(view)
+        )
+
+    def _cache_key(self, view: AnalysisView) -> str:
+        return make_cache_key(
+            "sentiment", self.llm.model, view.start_date, view.end_date, view.user,
+            frame_digest(view.df, ['user', 'message'])
+        )
+
+    def _parse_response(self, raw: str, df: pd.DataFrame, cache_key: str) -> dict:
+        """Extract the JSON result from the LLM output and cache it"""
+        result = extract_json(raw)
+        result["total_messages"] = len(df)
+        self.cache.set(cache_key, result)
+        return result
+
+    def get_daily_breakdown(self, df: pd.DataFrame, start_date: str, end_date: str, user: str = None) -> List[dict]:
+        """
+        Messages and active users per day, in one grouped aggregation
+
+        Not part of the analysis results: computed only for callers that chart it.
+        """
+        daily = get_analysis_view(df, start_date, end_date, user=user).df.groupby('only_date', sort=True).agg(
+            message_count=('message', 'size'),
+            users_count=('user', 'nunique'),
+        ).reset_index()
+        daily['only_date'] = daily['only_date'].astype(str)
+        return daily.rename(columns={'only_date': 'date'}).to_dict('records')
+
+    def _calculate_sentiment_scores(self, lower: pd.Series) -> dict:
+        """Keyword-based sentiment distribution, computed in one vectorized pass"""
+        total = len(lower)
+        if total == 0:
+            return {"positive": 0.0, "neutral": 0.0, "negative": 0.0}
+
+        membership = SENTIMENT_MATCHER.membership(lower)
+        pos_mask, neg_mask = membership[:, 0], membership[:, 1]
+
+        # A message with both kinds of keywords counts as positive
+        positive = int(pos_mask.sum())
+        negative = int((neg_mask & ~pos_mask).sum())
+        neutral = total - positive - negative
+
+        return {
+            "positive": round(positive / total, 3),
+            "neutral": round(neutral / total, 3),
+            "negative": round(negative / total, 3),
+        }
+
+    def _calculate_emotions(self, lower: pd.Series) -> dict:
+        """Share of messages showing each emotion, from one scan over all keywords"""
+        total = len(lower)
+        if total == 0:
+            return {name: 0.0 for name in EMOTION_MATCHER.names}
+
+        counts = EMOTION_MATCHER.message_counts(lower)
+        return {
+            name: round(int(count) / total, 3)
+            for name, count in zip(EMOTION_MATCHER.names, counts)
+        }
+
+    def _basic_sentiment_analysis(self, view: AnalysisView, raw: str = "") -> dict:
+        """Local fallback used when the LLM output cannot be parsed"""
+        return self._local_sentiment_analysis(
+            view, f"Keyword-based estimate (LLM sent messy JSON). Raw output: {str(raw)[:500]}"
+        )
+
+    def _local_sentiment_analysis(self, view: AnalysisView, insights: str = None) -> dict:
+        """Keyword-based sentiment and emotions without the LLM"""
+        return {
+            "overall_sentiment": self._calculate_sentiment_scores(view.lower),
+            "emotions": self._calculate_emotions(view.lower),
+            "insights": insights or "Keyword-based estimate (too few distinct messages for a full analysis).",
+            "total_messages": len(view)
+        }
@@ -1,47 +1,129 @@
 """
 Topic Modeling — FINAL BULLETPROOF VERSION
 """
+import logging
 import pandas as pd
-import json
-import re
-from llm.mistral_client import MistralClient
+import numpy as np
+from typing import List
+from analytics.analysis_view import AnalysisView, get_analysis_view
+from analytics.keyword_matcher import KeywordMatcher
+from analytics.sampling import sample_for_llm
+from analytics.sentiment_analyzer import POSITIVE_WORDS, NEGATIVE_WORDS
+from llm.mistral_client import get_mistral_client
 from llm.prompt_templates import get_topic_prompt
+from llm.json_utils import extract_json
+from llm.response_cache import get_response_cache, make_cache_key, frame_digest
+
+logger = logging.getLogger(__name__)
+
+
+# Keyword categories for the local (no-LLM) fallback
+TOPIC_KEYWORDS = {
+    'Plans & Meetups': ['plan', 'meet', 'tomorrow', 'tonight', 'weekend', 'party', 'come over'],
+    'Food & Drinks': ['food', 'eat', 'lunch', 'dinner', 'breakfast', 'pizza', 'coffee', 'chai'],
+    'Work & Studies': ['work', 'office', 'exam', 'class', 'project', 'assignment', 'deadline'],
+    'Movies, Music & Games': ['movie', 'film', 'song', 'music', 'game', 'match', 'series', 'netflix'],
+    'Travel': ['trip', 'travel', 'flight', 'train', 'ticket', 'hotel', 'vacation'],
+    'Money': ['money', 'pay', 'paid', 'bill', 'price', 'cost', 'upi'],
+}
+TOPIC_MATCHER = KeywordMatcher(TOPIC_KEYWORDS)
+
+# Topics plus the two sentiment polarities, so the fallback needs one scan
+_NUM_TOPICS = len(TOPIC_KEYWORDS)
+TOPIC_SENTIMENT_MATCHER = KeywordMatcher({
+    **TOPIC_KEYWORDS, 'positive': POSITIVE_WORDS, 'negative': NEGATIVE_WORDS
+})
 
 
 class TopicModeler:
     def __init__(self):
-        self.llm = MistralClient()
+        self.llm = get_mistral_client()
+        self.cache = get_response_cache()
 
     def extract_topics(self, df: pd.DataFrame, start_date: str, end_date: str, num_topics: int = 5) -> dict:
-        df = df.copy()
-        df = df[df['only_date']. astype(str).between(start_date, end_date)]
-        df = df[df['user'] != 'group_notification']
-        df = df[~df['message'].isin(['<Media omitted>', ''])]
+        view = get_analysis_view(df, start_date, end_date)
+        df = view.df
 
         if len(df) < 10:
             return {"topics": [], "analysis_summary": "Not enough messages.", "total_messages": len(df)}
 
-        messages = df. to_dict('records')
+        cache_key = make_cache_key(
+            "topics", self.llm.model, start_date, end_date, num_topics,
+            frame_digest(df, ['user', 'message'])
+        )
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        raw = ""
 
         try:
-            prompt = get_topic_prompt(messages, num_topics, f"{start_date} to {end_date}")
-            raw = self.llm.generate_text(prompt)
+            sample = sample_for_llm(df)
+            prompt = get_topic_prompt(
+                sample['user'].to_numpy(), sample['message'].to_numpy(), num_topics,
+                view.date_range, total_messages=len(df)
+            )
+            raw = self.llm.generate_text(prompt, persist=True)
 
             # PERFECT JSON EXTRACTOR — handles ```json
-            json_str = re.search(r"\{.*\}", raw, re.DOTALL)
-            if not json_str:
-                raise ValueError("No JSON found")
-
-            result = json.loads(json_str. group())
+            result = extract_json(raw)
 
-            result["total_messages"] = len(messages)
-            result["date_range"] = f"{start_date} to {end_date}"
+            result["total_messages"] = len(df)
+            result["date_range"] = view.date_range
+            self.cache.set(cache_key, result)
             return result
 
         except Exception as e: 
+            logger.warning("Topic LLM result unusable, using keywords: %s", e)
+            topics = self._extract_topics_from_keywords(view, num_topics)
+            if topics:
+                return {
+                    "topics": topics,
+                    "analysis_summary": "Keyword-based estimate (Mistral returned messy output).",
+                    "total_messages": len(df),
+                    "date_range": view.date_range
+                }
             return {
                 "topics": [],
                 "analysis_summary": f"Mistral returned messy output.  Raw: {str(raw)[:300]}...",
-                "total_messages": len(messages),
+                "total_messages": len(df),
                 "error": str(e)
             }
+
+    def _extract_topics_from_keywords(self, view: AnalysisView, num_topics: int) -> List[dict]:
+        """Keyword-category topics with per-topic sentiment, from one scan of the messages"""
+        hits = TOPIC_SENTIMENT_MATCHER.membership(view.lower)
+        topic_hits = hits[:, :_NUM_TOPICS]
+        positive = hits[:, _NUM_TOPICS]
+        negative = hits[:, _NUM_TOPICS + 1] & ~positive
+        users = view.df['user'].to_numpy()
+
+        # Per-topic totals and sentiment splits as whole-matrix reductions
+        counts = topic_hits.sum(axis=0)
+        pos_counts = positive.astype(np.int64) @ topic_hits
+        neg_counts = negative.astype(np.int64) @ topic_hits
+
+        topics = []
+        for topic_id in np.argsort(-counts, kind='stable')[:num_topics]:
+            count = int(counts[topic_id])
+            if count == 0:
+                break
+
+            name = TOPIC_MATCHER.names[topic_id]
+            pos = int(pos_counts[topic_id])
+            neg = int(neg_counts[topic_id])
+
+            topics.append({
+                "topic_name": name,
+                "description": f"{count} messages mention {name.lower()}",
+                "participants": pd.Series(users[topic_hits[:, topic_id]]).value_counts().head(3).index.tolist(),
+                "message_count": count,
+                "sentiment": {
+                    "positive": round(pos / count, 3),
+                    "neutral": round((count - pos - neg) / count, 3),
+                    "negative": round(neg / count, 3),
+                },
+                "key_keywords": TOPIC_KEYWORDS[name][:3],
+            })
+
+        return topics
@@ -6,6 +6,8 @@ WITH MULTI-API KEY SUPPORT (Mistral)
 """
 
 import os
+import re
+from functools import lru_cache
 from pathlib import Path
 from typing import List
 
@@ -15,14 +17,23 @@ from typing import List
 BASE_DIR = Path(__file__).parent.parent
 FAISS_INDEX_PATH = str(BASE_DIR / "data" / "faiss_index")
 FAISS_METADATA_PATH = str(BASE_DIR / "data" / "faiss_metadata.pkl")
+LLM_CACHE_PATH = str(BASE_DIR / "data" / "llm_cache.sqlite")
+EMBEDDING_CACHE_PATH = str(BASE_DIR / "data" / "embedding_cache.sqlite")
 
 # ------------------------------------------------------------------
 # CORE CONFIG – safe at import time
 # ------------------------------------------------------------------
 VECTOR_DB_TYPE = "faiss"
+VECTOR_INDEX_TYPE = "hnsw"  # "hnsw" (approximate, sub-linear search) or "flat" (exact)
+HNSW_MIN_VECTORS = 5000     # smaller indexes stay flat: exact and already fast
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+VECTOR_STORAGE = "fp16"     # stored vector precision: "fp16" (half the memory) or "fp32"
 
 EMBEDDING_MODEL = "thenlper/gte-small"
 EMBEDDING_DIMENSION = 384
+EMBEDDING_INT8_ON_CPU = False  # opt-in dynamic int8 quantization of the linear layers when no GPU is available
 
 # Mistral Model Configuration
 LLM_MODEL = "mistral-large-latest"  # or "mistral-medium-latest", "mistral-small-latest"
@@ -38,6 +49,7 @@ LOG_FILE = str(BASE_DIR / "logs" / "app.log")
 # Features
 ENABLE_CACHING = True
 CACHE_EXPIRY_HOURS = 24
+LLM_PERSIST_RESPONSES = False  # also keep raw analyzer prompts/completions (chat text) in LLM_CACHE_PATH
 MAX_DATE_RANGE_DAYS = 365
 MAX_RETRIEVED_MESSAGES = 10
 BATCH_SIZE = 32
@@ -45,6 +57,9 @@ BATCH_SIZE = 32
 # RAG
 RAG_TOP_K_MESSAGES = 50
 RAG_CONTEXT_SIZE = 3
+RAG_ANSWER_CACHE_SIZE = 256
+RAG_ANSWER_CACHE_THRESHOLD = 0.95  # cosine similarity for reusing an answer to a reworded question
+RAG_ANSWER_CACHE_TTL_SECONDS = 300
 
 # Topic Modeling
 DEFAULT_NUM_TOPICS = 5
@@ -54,6 +69,18 @@ MIN_NUM_TOPICS = 2
 # Sentiment
 SENTIMENT_BATCH_SIZE = 50
 
+# Max messages sampled into a single sentiment/topic prompt
+MAX_LLM_MESSAGES = 50
+
+# Token budget for the sampled message lines in one prompt
+PROMPT_SAMPLE_TOKEN_BUDGET = 2000
+
+# Smaller slices get the local keyword sentiment instead of an LLM call
+MIN_MESSAGES_FOR_LLM = 20
+
+# Max LLM requests in flight at once when independent analyses run concurrently
+LLM_MAX_CONCURRENT_REQUESTS = 4
+
 # Date/Time formats (back and safe!)
 DATE_FORMAT = "%Y-%m-%d"
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
@@ -74,23 +101,14 @@ def parse_api_keys(key_string: str) -> List[str]:
     if not key_string:
         return []
     
-    # Support both comma-separated and newline-separated keys
-    keys = []
-    for separator in [',', '\n']: 
-        if separator in key_string:
-            keys = [k.strip() for k in key_string.split(separator) if k.strip()]
-            break
-    
-    # If no separator found, treat as single key
-    if not keys and key_string.strip():
-        keys = [key_string.strip()]
-    
-    return keys
+    # Support both comma-separated and newline-separated keys (or a single key)
+    return [k.strip() for k in re.split(r'[,\n]', key_string) if k.strip()]
 
 
+@lru_cache(maxsize=1)
 def get_mistral_api_keys() -> List[str]:
     """
-    Get list of Mistral API keys with fallback support
+    Get list of Mistral API keys with fallback support (looked up once per process)
     
     Returns:
         List of API keys (at least one required)
@@ -4,12 +4,25 @@ Keep your existing helper.py functions here
 This file contains all your original analytics functions
 """
 
-from urlextract import URLExtract
-from collections import Counter
+import re
+import numpy as np
 import pandas as pd
-import emoji
 
-extract = URLExtract()
+# Cheap link matcher for counting, instead of building a URLExtract at import
+_URL_RE = re.compile(r'https?://\S+|www\.\S+')
+
+# Stop words are read once at import; fallback if the file is not available
+try:
+    with open('data/stop_words/stop_hinglish.txt', 'r', encoding='utf-8') as f:
+        _STOP_WORDS = frozenset(f.read().lower().split())
+except OSError:
+    _STOP_WORDS = frozenset(['the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at'])
+
+
+# Every emoji has a non-ASCII code point (keycaps end in U+20E3), so
+# plain-ASCII messages can skip the emoji scan
+_NON_ASCII_PATTERN = r'[^\x00-\x7f]'
+
 
 def fetch_stats(selected_user, df):
     """Fetch basic statistics"""
@@ -17,50 +30,40 @@ def fetch_stats(selected_user, df):
         df = df[df['user'] == selected_user]
 
     num_messages = df.shape[0]
-    words = []
-    for message in df['message']:
-        words.extend(str(message).split())
+    msgs = df['message'].astype(str)
 
-    num_media_messages = df[df['message'] == '<Media omitted>\n'].shape[0]
+    num_words = int(msgs.str.split().str.len().sum())
+    num_media_messages = int((msgs.to_numpy() == '<Media omitted>\n').sum())
+    # One regex scan over the joined text; links never span the '\n' separator
+    num_links = sum(1 for _ in _URL_RE.finditer('\n'.join(msgs.tolist())))
 
-    links = []
-    for message in df['message']:
-        links.extend(extract.find_urls(str(message)))
-
-    return num_messages, len(words), num_media_messages, len(links)
+    return num_messages, num_words, num_media_messages, num_links
 
 
 def most_busy_users(df):
     """Get most busy users"""
-    x = df['user'].value_counts().head()
-    df_users = round((df['user'].value_counts() / df.shape[0]) * 100, 2).reset_index().rename(
-        columns={'index': 'name', 'user': 'percent'})
+    counts = df['user'].value_counts()
+    x = counts.head()
+    df_users = pd.DataFrame({
+        'name': counts.index.to_numpy(),
+        'percent': (counts.to_numpy() / df.shape[0] * 100).round(2),
+    })
     return x, df_users
 
 
 def most_common_words(selected_user, df):
     """Get most common words"""
-    # Try to load stop words, fallback if not available
-    stop_words = set()
-    try:
-        with open('data/stop_words/stop_hinglish.txt', 'r', encoding='utf-8') as f:
-            stop_words.update(f.read().lower().split())
-    except:
-        stop_words.update(['the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at'])
-
     if selected_user != 'Overall':
         df = df[df['user'] == selected_user]
 
     temp = df[df['user'] != 'group_notification']
     temp = temp[temp['message'] != '<Media omitted>\n']
 
-    words = []
-    for message in temp['message']:
-        for word in str(message).lower().split():
-            if word not in stop_words and len(word) > 2:
-                words.append(word)
+    words = temp['message'].astype(str).str.lower().str.split().explode()
+    words = words[(words.str.len() > 2) & ~words.isin(_STOP_WORDS)]
 
-    most_common_df = pd.DataFrame(Counter(words).most_common(20))
+    counts = words.value_counts().head(20)
+    most_common_df = pd.DataFrame({0: counts.index, 1: counts.to_numpy()})
     return most_common_df
 
 
@@ -69,11 +72,18 @@ def emoji_helper(selected_user, df):
     if selected_user != 'Overall':
         df = df[df['user'] == selected_user]
 
-    emojis = []
-    for message in df['message']:
-        emojis.extend([c for c in str(message) if c in emoji.UNICODE_EMOJI['en']])
+    import emoji  # imported on first use; the emoji table is large
 
-    emoji_df = pd.DataFrame(Counter(emojis).most_common(len(Counter(emojis))))
+    msgs = df['message'].astype(str)
+    candidates = msgs[msgs.str.contains(_NON_ASCII_PATTERN, regex=True)]
+    # emoji_list walks emoji.EMOJI_DATA as a trie, so ZWJ/flag sequences count whole
+    all_text = '\n'.join(candidates.tolist())
+    found = np.array([match['emoji'] for match in emoji.emoji_list(all_text)], dtype=str)
+
+    # C-level sort-based counting instead of a Python-level Counter
+    emojis, counts = np.unique(found, return_counts=True)
+    order = np.argsort(-counts, kind='stable')
+    emoji_df = pd.DataFrame({0: emojis[order], 1: counts[order]})
     return emoji_df
 
 
@@ -82,12 +92,8 @@ def monthly_timeline(selected_user, df):
     if selected_user != 'Overall':
         df = df[df['user'] == selected_user]
 
-    timeline = df.groupby(['year', 'month_num', 'month']).count()['message'].reset_index()
-    time = []
-    for i in range(timeline.shape[0]):
-        time.append(timeline['month'][i] + "-" + str(timeline['year'][i]))
-
-    timeline['time'] = time
+    timeline = df.groupby(['year', 'month_num', 'month'], observed=True).count()['message'].reset_index()
+    timeline['time'] = timeline['month'].astype(str) + "-" + timeline['year'].astype(str)
     return timeline
 
 
@@ -105,7 +111,8 @@ def week_activity_map(selected_user, df):
     if selected_user != 'Overall':
         df = df[df['user'] == selected_user]
 
-    return df['day_name'].value_counts()
+    # As strings: a categorical would also count days that never occur
+    return df['day_name'].astype(str).value_counts()
 
 
 def month_activity_map(selected_user, df):
@@ -113,7 +120,7 @@ def month_activity_map(selected_user, df):
     if selected_user != 'Overall':
         df = df[df['user'] == selected_user]
 
-    return df['month'].value_counts()
+    return df['month'].astype(str).value_counts()
 
 
 def activity_heatmap(selected_user, df):
@@ -121,11 +128,9 @@ def activity_heatmap(selected_user, df):
     if selected_user != 'Overall':
         df = df[df['user'] == selected_user]
 
-    user_heatmap = df.pivot_table(
-        index='day_name',
-        columns='period',
-        values='message',
-        aggfunc='count'
-    ).fillna(0)
+    user_heatmap = df.groupby(['day_name', 'period'], observed=True).size().unstack(fill_value=0)
 
-    return user_heatmap
\ No newline at end of file
+    # Plain string labels, sorted as they were before the columns became categorical
+    user_heatmap.index = user_heatmap.index.astype(str)
+    user_heatmap.columns = user_heatmap.columns.astype(str)
+    return user_heatmap.sort_index().sort_index(axis=1)
\ No newline at end of file
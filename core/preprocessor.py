@@ -7,6 +7,19 @@ import pandas as pd
 from datetime import datetime
 import uuid
 
+# Hour-range label for each hour of the day ("23-00", "00-1", "1-2", ...)
+PERIOD_LABELS = [
+    "23-00" if hour == 23 else "00-1" if hour == 0 else f"{hour}-{hour + 1}"
+    for hour in range(24)
+]
+
+# Common Hinglish / Benglish words, matched case-insensitively and lowercased
+_NORMALIZE_WORDS = [
+    'kya', 'haan', 'nahi', 'acha', 'ache', 'bhai', 'yaar', 'thik',   # Hinglish
+    'tumi', 'ami', 'eita', 'koto', 'kothay',                         # Benglish
+]
+_NORMALIZE_RE = re.compile(r'\b(?:' + '|'.join(_NORMALIZE_WORDS) + r')\b', re.IGNORECASE)
+
 def is_system_message(user, message):
     """Check if a message is a system message or bot response"""
     system_keywords = [
@@ -67,23 +80,15 @@ def preprocess(data):
     df['only_date'] = df['date'].dt.date
     df['year'] = df['date'].dt.year
     df['month_num'] = df['date'].dt.month
-    df['month'] = df['date'].dt.month_name()
+    # Low-cardinality labels as categoricals: hashed once, int-coded groupby keys
+    df['month'] = df['date'].dt.month_name().astype('category')
     df['day'] = df['date'].dt.day
-    df['day_name'] = df['date'].dt.day_name()
+    df['day_name'] = df['date'].dt.day_name().astype('category')
     df['hour'] = df['date'].dt.hour
     df['minute'] = df['date'].dt.minute
     
     # Add period (hour range)
-    period = []
-    for hour in df['hour']:
-        if hour == 23:
-            period.append(str(hour) + "-" + str('00'))
-        elif hour == 0:
-            period.append(str('00') + "-" + str(hour + 1))
-        else:
-            period.append(str(hour) + "-" + str(hour + 1))
-    
-    df['period'] = period
+    df['period'] = pd.Categorical.from_codes(df['hour'].to_numpy(), categories=PERIOD_LABELS)
     
     # Add unique message ID
     df['message_id'] = [str(uuid.uuid4()) for _ in range(len(df))]
@@ -115,24 +120,15 @@ def detect_language(text):
         return 'english'
 
 
+def _lower_match(match):
+    return match.group(0).lower()
+
+
 def normalize_text(text):
     """Normalize Hinglish and Benglish variations"""
-    hinglish_map = {
-        r'\bkya\b': 'kya', r'\bhaan\b': 'haan', r'\bnahi\b': 'nahi',
-        r'\bacha\b': 'acha', r'\bache\b': 'ache', r'\bbhai\b': 'bhai',
-        r'\byaar\b': 'yaar', r'\bthik\b': 'thik'
-    }
-    
-    benglish_map = {
-        r'\btumi\b': 'tumi', r'\bami\b': 'ami', r'\bache\b': 'ache',
-        r'\beita\b': 'eita', r'\bkoto\b': 'koto', r'\bkothay\b': 'kothay'
-    }
-    
-    normalized = text
-    for pattern, replacement in hinglish_map.items():
-        normalized = re.sub(pattern, replacement, normalized, flags=re.IGNORECASE)
-    
-    for pattern, replacement in benglish_map.items():
-        normalized = re.sub(pattern, replacement, normalized, flags=re.IGNORECASE)
-    
-    return normalized
\ No newline at end of file
+    return _NORMALIZE_RE.sub(_lower_match, text)
+
+
+def normalize_series(messages: pd.Series) -> pd.Series:
+    """normalize_text over a whole message column (missing values become "")"""
+    return messages.fillna('').astype(str).str.replace(_NORMALIZE_RE, _lower_match, regex=True)
\ No newline at end of file
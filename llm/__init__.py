@@ -1,2 +1,10 @@
-from llm.mistral_client import MistralClient
 from llm.prompt_templates import *
+from llm.tokens import count_tokens, count_tokens_many
+
+
+def __getattr__(name):
+    # The client module (and the Mistral SDK behind it) loads on first access
+    if name in ("MistralClient", "get_mistral_client"):
+        from llm import mistral_client
+        return getattr(mistral_client, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
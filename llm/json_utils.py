@@ -0,0 +1,103 @@
+"""
+Helpers for pulling JSON objects out of LLM responses
+"""
+
+import json
+import re
+from typing import Any, Dict
+
+try:
+    import orjson
+except ImportError:  # optional speedup, stdlib json works the same
+    orjson = None
+
+# An object inside a ```json / ``` fence
+JSON_FENCE_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+
+
+def loads(text: str) -> Any:
+    """json.loads, backed by orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def extract_json(raw: str) -> Dict[str, Any]:
+    """
+    Parse the JSON object contained in an LLM response
+    
+    Raises:
+        ValueError: if no JSON object can be found (JSONDecodeError is a ValueError)
+    """
+    text = raw.strip()
+
+    # Fast path: clean response that is already bare JSON
+    if text.startswith("{"):
+        try:
+            return loads(text)
+        except ValueError:
+            pass
+
+    match = JSON_FENCE_RE.search(text)
+    if match:
+        return loads(match.group(1))
+
+    # Outermost {...} block surrounded by prose: two C-level scans, no backtracking
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError("No JSON found")
+    return loads(text[start:end + 1])
+
+
+class JsonObjectScanner:
+    """
+    Incrementally track a streamed response until its first top-level {...} closes
+
+    Lets a streaming caller stop reading as soon as the JSON is complete instead
+    of waiting for any trailing prose or closing fence.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._length = 0
+        self._end = None
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> bool:
+        """Add a chunk; True once the first top-level object has closed"""
+        if self._end is not None:
+            return True
+
+        self._parts.append(chunk)
+        for offset, ch in enumerate(chunk):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == "{":
+                self._depth += 1
+                self._started = True
+            elif not self._started:
+                continue
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._end = self._length + offset + 1
+                    return True
+
+        self._length += len(chunk)
+        return False
+
+    @property
+    def text(self) -> str:
+        """Everything received, cut after the closing brace once the object is complete"""
+        text = "".join(self._parts)
+        return text if self._end is None else text[:self._end]
@@ -3,14 +3,40 @@ Mistral AI client for LLM operations
 WITH MULTI-API KEY FALLBACK SUPPORT
 """
 
-from mistralai import Mistral
 from typing import Optional, Dict, Any, List
+import asyncio
 import json
+import logging
+import re
+import threading
 import time
+import weakref
+from collections import OrderedDict
+from contextlib import closing
+from functools import lru_cache
 
 # Import config values that are SAFE at import time
 from config.settings import LLM_MODEL, LLM_TEMPERATURE, LLM_MAX_TOKENS, LLM_TOP_P
-from config.settings import get_mistral_api_keys
+from config.settings import get_mistral_api_keys, LLM_PERSIST_RESPONSES
+from llm.json_utils import extract_json, JsonObjectScanner
+from llm.tokens import count_tokens
+from llm.response_cache import get_response_cache, make_cache_key
+
+logger = logging.getLogger(__name__)
+
+# Recent (model, temperature, prompt) -> response text kept in memory, for
+# Streamlit reruns; only opted-in analyzer prompts also go to the persistent cache
+RESPONSE_CACHE_SIZE = 128
+
+# Errors worth retrying with another API key (quota, rate limit, server-side)
+_RETRYABLE_RE = re.compile(
+    r"quota|rate limit|429|resource exhausted|too many requests|unavailable|503|500|timeout",
+    re.IGNORECASE
+)
+
+# Exponential backoff between retries: 0.25s, 0.5s, 1s, ... capped at 4s
+RETRY_BASE_DELAY = 0.25
+RETRY_MAX_DELAY = 4.0
 
 
 class MistralClient:
@@ -22,6 +48,15 @@ class MistralClient:
         self.api_keys = get_mistral_api_keys()
         self.current_key_index = 0
         
+        # One SDK client per key, kept for the client's lifetime so rotating
+        # back to a key reuses its HTTP connection pool
+        self._clients = {}
+        
+        # Async SDK clients per event loop: an httpx async pool is bound to the
+        # loop it was opened on, and each asyncio.run() starts a new loop
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._async_clients_lock = threading.Lock()
+        
         # Configure with first key
         self._configure_api(self.api_keys[self.current_key_index])
         
@@ -29,11 +64,28 @@ class MistralClient:
         self. temperature = LLM_TEMPERATURE
         self.max_tokens = LLM_MAX_TOKENS
         self.top_p = LLM_TOP_P
+        
+        self._responses = OrderedDict()
+        self._responses_lock = threading.Lock()
+        self._store = get_response_cache()
+        
+        # Sampling parameters are fixed per client; build them once
+        self._default_params = {
+            "model": self.model,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "top_p": self.top_p,
+        }
     
     def _configure_api(self, api_key: str):
         """Configure Mistral API with specific key"""
-        self. client = Mistral(api_key=api_key)
-        print(f"[Mistral] Configured with API key #{self. current_key_index + 1}")
+        client = self._clients.get(api_key)
+        if client is None:
+            # SDK imported on first client creation, not at app start-up
+            from mistralai import Mistral
+            client = self._clients[api_key] = Mistral(api_key=api_key)
+        self.client = client
+        logger.info("Configured with API key #%d", self.current_key_index + 1)
     
     def _switch_to_next_key(self) -> bool:
         """
@@ -45,25 +97,44 @@ class MistralClient:
         if self.current_key_index < len(self.api_keys) - 1:
             self.current_key_index += 1
             self._configure_api(self.api_keys[self.current_key_index])
-            print(f"[Mistral] Switched to API key #{self.current_key_index + 1}")
+            logger.info("Switched to API key #%d", self.current_key_index + 1)
             return True
         return False
     
     def _is_retryable_error(self, error_msg: str) -> bool:
         """Check if error is retryable with different API key"""
-        retryable_keywords = [
-            "quota",
-            "rate limit",
-            "429",
-            "resource exhausted",
-            "too many requests",
-            "unavailable",
-            "503",
-            "500",
-            "timeout",
-        ]
-        error_lower = error_msg.lower()
-        return any(keyword in error_lower for keyword in retryable_keywords)
+        return _RETRYABLE_RE.search(error_msg) is not None
+    
+    def _recover_from_error(self, error: Exception, keys_tried: set, attempt: int) -> Optional[float]:
+        """
+        Decide how to continue after a failed call, switching keys if possible
+        
+        Returns:
+            Seconds to wait before retrying, or None if the error should be raised
+        """
+        error_msg = str(error)
+        logger.warning("Error with key #%d: %.100s", self.current_key_index + 1, error_msg)
+        
+        # Non-retryable error
+        if not self._is_retryable_error(error_msg):
+            return None
+        
+        # Clients are kept per key, so switching is just a lookup; only the wait grows
+        delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+        
+        # Try to switch to next key
+        if self._switch_to_next_key():
+            return delay
+        
+        # No more keys, reset to first untried key
+        untried_keys = [i for i in range(len(self.api_keys)) if i not in keys_tried]
+        if untried_keys:
+            self.current_key_index = untried_keys[0]
+            self._configure_api(self. api_keys[self.current_key_index])
+            return delay
+        
+        # All keys tried
+        return None
     
     def _execute_with_fallback(self, operation_func, max_retries:  int = None):
         """
@@ -89,113 +160,216 @@ class MistralClient:
                 keys_tried.add(self.current_key_index)
                 
                 # Execute the operation
-                result = operation_func()
-                return result
+                return operation_func()
                 
             except Exception as e:
-                error_msg = str(e)
                 last_error = e
-                attempts += 1
-                
-                print(f"[Mistral] Error with key #{self.current_key_index + 1}: {error_msg[: 100]}")
                 
-                # Check if error is retryable
-                if self._is_retryable_error(error_msg):
-                    # Try to switch to next key
-                    if self._switch_to_next_key():
-                        # Small delay before retry
-                        time.sleep(0.5)
-                        continue
-                    else:
-                        # No more keys, reset to first untried key or first key
-                        untried_keys = [i for i in range(len(self.api_keys)) if i not in keys_tried]
-                        if untried_keys:
-                            self.current_key_index = untried_keys[0]
-                            self._configure_api(self. api_keys[self.current_key_index])
-                            time.sleep(1)
-                            continue
-                        else: 
-                            # All keys tried, raise error
-                            break
-                else:
-                    # Non-retryable error
+                delay = self._recover_from_error(e, keys_tried, attempts)
+                attempts += 1
+                if delay is None:
                     raise
+                time.sleep(delay)
         
         # All retries exhausted
         if last_error:
             raise last_error
     
-    def generate_text(self, prompt: str, temperature: Optional[float] = None) -> str:
-        """Generate text with automatic API key fallback"""
+    async def _execute_with_fallback_async(self, operation_func, max_retries: int = None):
+        """
+        Async counterpart of _execute_with_fallback (operation_func takes an SDK
+        client and returns a coroutine)
         
-        def _generate():
-            temp = temperature if temperature is not None else self.temperature
-            
-            response = self.client.chat.complete(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                temperature=temp,
-                max_tokens=self.max_tokens,
-                top_p=self.top_p,
-            )
-            
-            if response.choices and len(response.choices) > 0:
-                return response.choices[0].message.content or ""
+        Concurrent calls share this object, so each one rotates through the keys
+        with its own index instead of moving current_key_index.
+        """
+        if max_retries is None:
+            max_retries = len(self.api_keys)
+        
+        start = self.current_key_index
+        for attempt in range(max_retries):
+            key_index = (start + attempt) % len(self.api_keys)
+            try:
+                return await operation_func(self._async_client(self.api_keys[key_index]))
             
-            return ""
+            except Exception as e:
+                logger.warning("Error with key #%d: %.100s", key_index + 1, e)
+                if attempt == max_retries - 1 or not self._is_retryable_error(str(e)):
+                    raise
+                await asyncio.sleep(min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+    
+    def _new_async_client(self, api_key: str):
+        """SDK client with its own async connection pool, returned with that pool"""
+        import httpx
+        from mistralai import Mistral
+        http_client = httpx.AsyncClient()
+        return Mistral(api_key=api_key, async_client=http_client), http_client
+    
+    def _async_client(self, api_key: str):
+        """SDK client for async calls on the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._async_clients_lock:
+            clients = self._async_clients.setdefault(loop, {})
+            if api_key not in clients:
+                clients[api_key] = self._new_async_client(api_key)
+            return clients[api_key][0]
+    
+    async def aclose(self):
+        """Close the async connection pools opened on the running event loop"""
+        with self._async_clients_lock:
+            clients = self._async_clients.pop(asyncio.get_running_loop(), {})
+        for _, http_client in clients.values():
+            await http_client.aclose()
+    
+    def _chat_params(self, prompt: str, temperature: Optional[float]) -> Dict[str, Any]:
+        """Request parameters shared by the sync and async completion calls"""
+        params = {**self._default_params, "messages": [{"role": "user", "content": prompt}]}
+        if temperature is not None:
+            params["temperature"] = temperature
+        return params
+    
+    @staticmethod
+    def _response_text(response) -> str:
+        """Extract message content from a chat completion response"""
+        if response.choices and len(response.choices) > 0:
+            return response.choices[0].message.content or ""
+        return ""
+    
+    def _response_key(self, prompt: str, temperature: Optional[float]) -> str:
+        """Hash of everything that determines the response"""
+        if temperature is None:
+            temperature = self.temperature
+        return make_cache_key("text", self.model, temperature, self.max_tokens, prompt)
+    
+    @staticmethod
+    def _persists(persist: bool) -> bool:
+        """
+        Whether a response may go to the on-disk cache
+        
+        Prompts carry chat text, so only callers that ask for it (the analyzers,
+        never QA) are stored, and only when LLM_PERSIST_RESPONSES is enabled.
+        """
+        return persist and LLM_PERSIST_RESPONSES
+    
+    def _cached_response(self, key: str, persist: bool = False) -> Optional[str]:
+        """In-memory LRU first, then the on-disk cache (survives restarts) if persisted"""
+        with self._responses_lock:
+            text = self._responses.get(key)
+            if text is not None:
+                self._responses.move_to_end(key)
+                return text
+        
+        if not self._persists(persist):
+            return None
+        text = self._store.get(key)
+        if text is not None:
+            self._remember_response(key, text)
+        return text
+    
+    def _remember_response(self, key: str, text: str, persist: bool = False):
+        if not text:
+            return
+        if self._persists(persist):
+            self._store.set(key, text)
+        with self._responses_lock:
+            self._responses[key] = text
+            self._responses.move_to_end(key)
+            while len(self._responses) > RESPONSE_CACHE_SIZE:
+                self._responses.popitem(last=False)
+    
+    def generate_text(self, prompt: str, temperature: Optional[float] = None, persist: bool = False) -> str:
+        """
+        Generate text with automatic API key fallback
+        
+        persist=True lets the response be stored on disk (see _persists)
+        """
+        key = self._response_key(prompt, temperature)
+        cached = self._cached_response(key, persist)
+        if cached is not None:
+            return cached
+        
+        def _generate():
+            response = self.client.chat.complete(**self._chat_params(prompt, temperature))
+            return self._response_text(response)
+        
+        try:
+            text = self._execute_with_fallback(_generate)
+            self._remember_response(key, text, persist)
+            return text
+        
+        except Exception as e:
+            error_msg = str(e)
+            logger.error("All API keys exhausted: %s", e)
+            return f"[Error:  All API keys failed.  {error_msg[: 100]}]"
+    
+    async def generate_text_async(self, prompt: str, temperature: Optional[float] = None, persist: bool = False) -> str:
+        """Non-blocking generate_text, so independent prompts can run concurrently"""
+        key = self._response_key(prompt, temperature)
+        cached = self._cached_response(key, persist)
+        if cached is not None:
+            return cached
+        
+        async def _generate(client):
+            response = await client.chat.complete_async(**self._chat_params(prompt, temperature))
+            return self._response_text(response)
         
         try:
-            return self._execute_with_fallback(_generate)
+            text = await self._execute_with_fallback_async(_generate)
+            self._remember_response(key, text, persist)
+            return text
         
         except Exception as e:
             error_msg = str(e)
-            print(f"[Mistral Error] All API keys exhausted: {e}")
+            logger.error("All API keys exhausted: %s", e)
             return f"[Error:  All API keys failed.  {error_msg[: 100]}]"
     
-    def generate_json(self, prompt: str) -> Optional[Dict[str, Any]]: 
+    def count_tokens(self, text: str) -> int:
+        """Estimate prompt size locally (no API call)"""
+        return count_tokens(text)
+    
+    def _stream_json_text(self, prompt: str) -> str:
+        """Stream a completion, stopping as soon as its first top-level JSON object closes"""
+        scanner = JsonObjectScanner()
+        # chat.stream returns a plain event generator; closing it releases the response
+        with closing(self.client.chat.stream(**self._chat_params(prompt, None))) as events:
+            for event in events:
+                choices = event.data.choices
+                content = choices[0].delta.content if choices else None
+                if isinstance(content, str) and scanner.feed(content):
+                    break
+        return scanner.text
+    
+    def generate_json(self, prompt: str, persist: bool = False) -> Optional[Dict[str, Any]]: 
         """Generate JSON response with automatic API key fallback"""
+        # Add JSON instruction to prompt
+        json_prompt = f"{prompt}\n\nRespond with valid JSON only."
+        key = self._response_key(json_prompt, None)
         
-        def _generate():
-            # Add JSON instruction to prompt
-            json_prompt = f"{prompt}\n\nRespond with valid JSON only."
-            response_text = self.generate_text(json_prompt)
+        try: 
+            response_text = self._cached_response(key, persist)
+            if response_text is None:
+                response_text = self._execute_with_fallback(lambda: self._stream_json_text(json_prompt))
             
-            # Check if response is an error
-            if response_text. startswith("[Error"):
-                print(f"[Mistral] Error response: {response_text}")
+            if not response_text.strip():
                 return None
             
-            if not response_text. strip():
-                return None
-
-            # Extract JSON from ```json or ```
-            start = response_text.find("```json")
-            if start == -1:
-                start = response_text.find("```")
-                if start != -1:
-                    start += 3
-            else:
-                start += 7
-
-            if start != -1:
-                end = response_text.find("```", start)
-                if end != -1:
-                    json_str = response_text[start: end]. strip()
-                    return json.loads(json_str)
-
-            # Try parsing entire response
-            return json.loads(response_text. strip())
-        
-        try: 
-            return self._execute_with_fallback(_generate)
+            result = extract_json(response_text)
+            self._remember_response(key, response_text, persist)
+            return result
         except json.JSONDecodeError as e:
-            print(f"[Mistral Error] JSON decode failed: {e}")
+            logger.warning("JSON decode failed: %s", e)
             return None
         except Exception as e: 
-            print(f"[Mistral Error] generate_json failed: {e}")
+            logger.error("generate_json failed: %s", e)
             return None
+
+
+@lru_cache(maxsize=1)
+def get_mistral_client() -> MistralClient:
+    """
+    Process-wide MistralClient
+    
+    Reusing one client keeps the SDK's HTTP connection pool (and the current
+    API key position) alive across analyzer and RAG calls.
+    """
+    return MistralClient()
@@ -1,44 +1,87 @@
 """
 Prompt templates for different LLM tasks — SAFETY-FRIENDLY VERSION
-Neutral language that won't trigger Gemini's safety filters
+Neutral wording, so chat content isn't mistaken for unsafe requests
 """
 
+from itertools import islice
+from typing import Optional, Sequence, Tuple
+
+from config.settings import PROMPT_SAMPLE_TOKEN_BUDGET
+from llm.tokens import count_tokens_many
+
+
+_CONTEXT_LINE = "{} ({}): {}".format
+
+
+def _format_context_line(msg: dict) -> str:
+    """'user (date): message', with the retriever's fallback field names"""
+    return _CONTEXT_LINE(
+        msg.get('user', 'Unknown'),
+        msg.get('date') or msg.get('timestamp') or 'N/A',
+        msg.get('message') or msg.get('original_message') or 'N/A',
+    )
+
+
+# Static instructions go first and per-call data last, so consecutive
+# requests share the longest possible prompt prefix (provider-side prefix caching)
+QA_PROMPT_PREFIX = """You are analyzing a private WhatsApp group chat between friends.
+Analyze the conversation naturally and provide accurate, helpful answers.
+
+Based on the chat messages below, answer the user's question accurately and conversationally.
+Provide a direct, informative answer based on the conversation.
+"""
+
+
+# Static fragments around the per-call context, joined once at import
+_QA_CONTEXT_HEADER = QA_PROMPT_PREFIX + "\nCHAT CONTEXT:\n"
+_QA_QUESTION_HEADER = "\n\nUSER QUESTION: "
+
+
 def get_qa_prompt(query: str, context_messages: list) -> str:
     """Generate prompt for Q&A task"""
     
-    context_text = "\n".join([
-        f"{msg.get('user', 'Unknown')} ({msg.get('date', msg.get('timestamp', 'N/A'))}): {msg.get('message', msg.get('original_message', 'N/A'))}"
-        for msg in context_messages
-    ])
+    context_text = "\n".join(map(_format_context_line, context_messages))
     
-    prompt = f"""You are analyzing a private WhatsApp group chat between friends.
-Analyze the conversation naturally and provide accurate, helpful answers.
+    return "".join((_QA_CONTEXT_HEADER, context_text, _QA_QUESTION_HEADER, query))
 
-Based on the following chat messages, answer the user's question accurately and conversationally.
 
-CHAT CONTEXT:
-{context_text}
+def _pack_sample(
+    users: Sequence[str],
+    messages: Sequence[str],
+    max_messages: int,
+    line_format: str = "- {}: {}"
+) -> Tuple[str, int]:
+    """
+    Format up to max_messages sample lines within PROMPT_SAMPLE_TOKEN_BUDGET
 
-USER QUESTION: {query}
+    A few very long messages would otherwise crowd out the rest of the sample
+    and push the prompt towards the model's limits; lines that don't fit the
+    remaining budget are skipped.
 
-Provide a direct, informative answer based on the conversation above."""
-    
-    return prompt
+    Returns:
+        (joined lines, number of lines kept)
+    """
+    lines = list(map(line_format.format, islice(users, max_messages), islice(messages, max_messages)))
 
+    kept = []
+    used = 0
+    for line, tokens in zip(lines, count_tokens_many(lines)):
+        if used + tokens > PROMPT_SAMPLE_TOKEN_BUDGET:
+            continue
+        kept.append(line)
+        used += tokens
+
+    return "\n".join(kept), len(kept)
 
-def get_sentiment_prompt(messages: list, date_range: str) -> str:
-    """Generate prompt for sentiment analysis — NEUTRAL VERSION"""
-    
-    sample_messages = "\n".join([
-        f"- {msg['user']}: {msg['message']}"
-        for msg in messages[:50]
-    ])
-    
-    prompt = f"""Analyze the sentiment of this WhatsApp group chat from {date_range}.
-Total messages: {len(messages)}
 
-SAMPLE MESSAGES:
-{sample_messages}
+def _sample_note(shown: int, total_messages: int) -> str:
+    """Tell the model when it sees a sample rather than the whole slice"""
+    if shown < total_messages:
+        return f" ({shown} sampled from N={total_messages})"
+    return ""
+
+
+SENTIMENT_PROMPT_PREFIX = """Analyze the sentiment of a WhatsApp group chat.
 
 Perform a detailed sentiment analysis considering:
 1. Overall sentiment distribution
@@ -47,13 +90,13 @@ Perform a detailed sentiment analysis considering:
 4. Communication patterns
 
 Return ONLY valid JSON (no markdown, no extra text) with this exact structure:
-{{
-    "overall_sentiment": {{
+{
+    "overall_sentiment": {
         "positive": 0.0,
         "neutral": 0.0,
         "negative": 0.0
-    }},
-    "emotions": {{
+    },
+    "emotions": {
         "joy": 0.0,
         "anger": 0.0,
         "frustration": 0.0,
@@ -61,101 +104,154 @@ Return ONLY valid JSON (no markdown, no extra text) with this exact structure:
         "enthusiasm": 0.0,
         "excitement": 0.0,
         "concern": 0.0
-    }},
+    },
     "primary_emotion": "joy",
     "insights": "Detailed insights about the conversation sentiment and tone"
-}}
+}
 
-All percentages must sum to 1.0. Be accurate and objective."""
-    
-    return prompt
+All percentages must sum to 1.0. Be accurate and objective.
+"""
 
 
-def get_sentiment_scores_prompt(messages: list, date_range: str) -> str:
-    """Simplified sentiment scoring — NEUTRAL VERSION"""
+def get_sentiment_prompt(
+    users: Sequence[str],
+    messages: Sequence[str],
+    date_range: str,
+    total_messages: Optional[int] = None
+) -> str:
+    """Generate prompt for sentiment analysis — NEUTRAL VERSION
+    
+    users/messages are parallel columns (e.g. df['user'].values, df['message'].values);
+    total_messages is the size of the full slice when a sample is passed
+    """
+    if total_messages is None:
+        total_messages = len(messages)
+    
+    sample_messages, shown = _pack_sample(users, messages, 50)
+    sample_note = _sample_note(shown, total_messages)
     
-    sample_messages = "\n".join([
-        f"{msg['user']}: {msg['message']}"
-        for msg in messages[:50]
-    ])
+    prompt = f"""{SENTIMENT_PROMPT_PREFIX}
+DATE RANGE: {date_range}
+Total messages: {total_messages}
+
+SAMPLE MESSAGES{sample_note}:
+{sample_messages}"""
     
-    prompt = f"""Analyze sentiment of these WhatsApp messages from {date_range} ({len(messages)} total):
+    return prompt
 
-{sample_messages}
+
+SENTIMENT_SCORES_PROMPT_PREFIX = """Analyze the sentiment of a set of WhatsApp messages.
 
 Score the overall sentiment as POSITIVE, NEUTRAL, or NEGATIVE.
 
 Return ONLY this JSON:
-{{
+{
     "positive_score": 0.0,
     "neutral_score": 0.0,
     "negative_score": 0.0
-}}
+}
 
-Scores must sum to exactly 1.0."""
-    
-    return prompt
+Scores must sum to exactly 1.0.
+"""
 
 
-def get_topic_prompt(messages: list, num_topics: int, date_range: str) -> str:
-    """Generate prompt for topic extraction — NEUTRAL VERSION"""
+def get_sentiment_scores_prompt(users: Sequence[str], messages: Sequence[str], date_range: str) -> str:
+    """Simplified sentiment scoring — NEUTRAL VERSION
+    
+    users/messages are parallel columns, as in get_sentiment_prompt
+    """
     
-    sample_messages = "\n".join([
-        f"- {msg['user']}: {msg['message']}"
-        for msg in messages[:50]
-    ])
+    sample_messages, _ = _pack_sample(users, messages, 50, line_format="{}: {}")
     
-    prompt = f"""Analyze this WhatsApp group chat from {date_range}.
+    prompt = f"""{SENTIMENT_SCORES_PROMPT_PREFIX}
+DATE RANGE: {date_range}
 Total messages: {len(messages)}
 
-SAMPLE MESSAGES:
-{sample_messages}
+MESSAGES:
+{sample_messages}"""
+    
+    return prompt
 
-Identify up to {num_topics} main topics discussed in the conversation.
+
+TOPIC_PROMPT_PREFIX = """Analyze a WhatsApp group chat and identify the main topics discussed in the conversation.
 
 Return ONLY valid JSON (no markdown) with this exact structure:
-{{
+{
     "topics": [
-        {{
+        {
             "topic_name": "Topic title (e.g., 'Work Projects', 'Weekend Plans')",
             "description": "What was discussed about this topic",
             "participants": ["Name1", "Name2"],
             "message_count": 0,
-            "sentiment": {{
+            "sentiment": {
                 "positive": 0.0,
                 "neutral": 0.0,
                 "negative": 0.0
-            }},
+            },
             "key_keywords": ["keyword1", "keyword2", "keyword3"]
-        }}
+        }
     ],
     "analysis_summary": "Overall summary of topics discussed and main themes"
-}}
+}
 
-Be objective and thorough."""
-    
-    return prompt
+Be objective and thorough.
+"""
 
 
-def get_topic_sentiment_prompt(messages: list, topic: str) -> str:
-    """Topic-specific sentiment — NEUTRAL VERSION"""
+def get_topic_prompt(
+    users: Sequence[str],
+    messages: Sequence[str],
+    num_topics: int,
+    date_range: str,
+    total_messages: Optional[int] = None
+) -> str:
+    """Generate prompt for topic extraction — NEUTRAL VERSION
+    
+    users/messages are parallel columns (e.g. df['user'].values, df['message'].values);
+    total_messages is the size of the full slice when a sample is passed
+    """
+    if total_messages is None:
+        total_messages = len(messages)
     
-    sample_messages = "\n".join([
-        f"- {msg['user']}: {msg['message']}"
-        for msg in messages[:15]
-    ])
+    sample_messages, shown = _pack_sample(users, messages, 50)
+    sample_note = _sample_note(shown, total_messages)
     
-    prompt = f"""Analyze sentiment about the topic: "{topic}" in this WhatsApp conversation.
+    prompt = f"""{TOPIC_PROMPT_PREFIX}
+Identify up to {num_topics} main topics.
 
-RELATED MESSAGES:
-{sample_messages}
+DATE RANGE: {date_range}
+Total messages: {total_messages}
+
+SAMPLE MESSAGES{sample_note}:
+{sample_messages}"""
+    
+    return prompt
+
+
+TOPIC_SENTIMENT_PROMPT_PREFIX = """Analyze the sentiment about one topic in a WhatsApp conversation.
 
 Return ONLY this JSON:
-{{
-    "topic": "{topic}",
-    "sentiment": {{"positive": 0.0, "neutral": 0.0, "negative": 0.0}},
+{
+    "topic": "The topic name given below",
+    "sentiment": {"positive": 0.0, "neutral": 0.0, "negative": 0.0},
     "key_points": ["point1", "point2", "point3"],
     "summary": "Brief summary of how this topic is discussed"
-}}"""
+}
+"""
+
+
+def get_topic_sentiment_prompt(users: Sequence[str], messages: Sequence[str], topic: str) -> str:
+    """Topic-specific sentiment — NEUTRAL VERSION
+    
+    users/messages are parallel columns, as in get_topic_prompt
+    """
+    
+    sample_messages, _ = _pack_sample(users, messages, 15)
+    
+    prompt = f"""{TOPIC_SENTIMENT_PROMPT_PREFIX}
+TOPIC: "{topic}"
+
+RELATED MESSAGES:
+{sample_messages}"""
     
     return prompt
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""
+Persistent exact-match cache for LLM results (SQLite)
+Repeated analyses of the same messages skip the Mistral round-trip
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Any, List, Optional
+
+import pandas as pd
+
+from config.settings import ENABLE_CACHING, CACHE_EXPIRY_HOURS, LLM_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(*parts) -> str:
+    """Build a stable cache key from the request inputs"""
+    payload = json.dumps([str(p) for p in parts], ensure_ascii=False)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def frame_digest(df: pd.DataFrame, columns: List[str]) -> str:
+    """Content hash of the given DataFrame columns (vectorized, index-independent)"""
+    row_hashes = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    return hashlib.blake2b(row_hashes.tobytes(), digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """Key -> JSON value store with expiry, safe to share across Streamlit sessions"""
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        ttl_hours: float = CACHE_EXPIRY_HOURS,
+        enabled: bool = ENABLE_CACHING
+    ):
+        self.ttl_seconds = ttl_hours * 3600
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if not self.enabled:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning("Response cache disabled, could not open %s: %s", path, e)
+            self.enabled = False
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None on miss/expiry"""
+        if not self.enabled:
+            return None
+
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Response cache read failed: %s", e)
+            return None
+
+        if row is None:
+            return None
+
+        value, created_at = row
+        if time.time() - created_at > self.ttl_seconds:
+            return None
+        return json.loads(value)
+
+    def set(self, key: str, value: Any):
+        """Store a JSON-serialisable value"""
+        if not self.enabled:
+            return
+
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False, default=str), time.time())
+                )
+                self._conn.commit()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning("Response cache write failed: %s", e)
+
+
+@lru_cache(maxsize=1)
+def get_response_cache() -> ResponseCache:
+    """Process-wide cache instance"""
+    return ResponseCache()
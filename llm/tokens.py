@@ -0,0 +1,93 @@
+"""
+Local token counting, so prompt sizes can be checked without an API call
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# The same messages go through the QA, sentiment and topic prompts, so
+# counts are memoized by content hash
+TOKEN_CACHE_SIZE = 4096
+
+_token_counts = OrderedDict()
+_token_counts_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _tokenizer() -> Optional[Callable[[List[str]], List[int]]]:
+    """
+    Batch token counter from the best local tokenizer installed, or None
+
+    mistral-common gives exact counts for the Mistral models the app calls;
+    tiktoken's cl100k_base is a close estimator when it is missing.
+    """
+    try:
+        from mistral_common.tokens.tokenizers.mistral import MistralTokenizer
+        tokenizer = MistralTokenizer.v3().instruct_tokenizer.tokenizer
+        return lambda texts: [len(tokenizer.encode(text, bos=False, eos=False)) for text in texts]
+    except Exception:
+        pass
+
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda texts: [len(ids) for ids in encoding.encode_batch(texts, disallowed_special=())]
+    except Exception as e:
+        logger.info("Local tokenizer unavailable, using length estimate: %s", e)
+        return None
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def _estimate(text: str) -> int:
+    # Rough fallback: ~4 UTF-8 bytes per token (counting bytes rather than
+    # characters keeps Hindi/Bengali/emoji-heavy messages from being undercounted)
+    return len(text.encode("utf-8")) // 4
+
+
+def _count_uncached(texts: List[str]) -> List[int]:
+    tokenizer = _tokenizer()
+    if tokenizer is not None:
+        try:
+            return tokenizer(texts)
+        except Exception:
+            pass
+    return [_estimate(text) for text in texts]
+
+
+def count_tokens_many(texts: List[str]) -> List[int]:
+    """Approximate token counts for several texts, tokenizing only the unseen ones in one batch"""
+    keys = [_digest(text) for text in texts]
+    counts = [None] * len(texts)
+
+    with _token_counts_lock:
+        for i, key in enumerate(keys):
+            count = _token_counts.get(key)
+            if count is not None:
+                _token_counts.move_to_end(key)
+                counts[i] = count
+
+    missing = [i for i, count in enumerate(counts) if count is None]
+    if missing:
+        fresh = _count_uncached([texts[i] for i in missing])
+        with _token_counts_lock:
+            for i, count in zip(missing, fresh):
+                counts[i] = count
+                _token_counts[keys[i]] = count
+            while len(_token_counts) > TOKEN_CACHE_SIZE:
+                _token_counts.popitem(last=False)
+
+    return counts
+
+
+def count_tokens(text: str) -> int:
+    """Approximate number of tokens in text"""
+    return count_tokens_many([text])[0]
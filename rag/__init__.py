@@ -1,5 +1,17 @@
-from rag.vector_store import VectorStore
-from rag.embeddings import EmbeddingModel
-from rag.retriever import ChatRetriever
-from rag.chat_indexer import ChatIndexer
-from rag.rag_pipeline import RAGPipeline
\ No newline at end of file
+# Submodules load on first access, so importing one of them (or the package)
+# doesn't pull in FAISS, torch and sentence-transformers for every page
+_EXPORTS = {
+    "VectorStore": "rag.vector_store",
+    "EmbeddingModel": "rag.embeddings",
+    "get_embedding_model": "rag.embeddings",
+    "ChatRetriever": "rag.retriever",
+    "ChatIndexer": "rag.chat_indexer",
+    "RAGPipeline": "rag.rag_pipeline",
+}
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        import importlib
+        return getattr(importlib.import_module(_EXPORTS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,81 @@
+"""
+Answer cache for the RAG pipeline (exact + semantic match on the question)
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from config.settings import RAG_ANSWER_CACHE_SIZE, RAG_ANSWER_CACHE_THRESHOLD, RAG_ANSWER_CACHE_TTL_SECONDS
+
+
+def retrieval_digest(message_ids: Iterable[str], date_range=None) -> str:
+    """Order-independent hash of the retrieved message ids (and the date filter)"""
+    payload = "\n".join(sorted(message_ids)) + f"\n{date_range}"
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class AnswerCache:
+    """
+    Cached answers for one pipeline (one chat index)
+
+    A near-duplicate question only reuses an answer when it retrieved exactly
+    the same messages, so a hit never answers from different evidence.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RAG_ANSWER_CACHE_SIZE,
+        threshold: float = RAG_ANSWER_CACHE_THRESHOLD,
+        ttl_seconds: float = RAG_ANSWER_CACHE_TTL_SECONDS
+    ):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        # query key -> (query embedding, retrieval digest, result, created_at); embeddings
+        # are unit length, so a dot product is the cosine similarity
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _query_key(query: str) -> str:
+        return hashlib.blake2b(" ".join(query.lower().split()).encode("utf-8"), digest_size=16).hexdigest()
+
+    def get(self, query: str, query_embedding: np.ndarray, digest: str) -> Optional[Dict]:
+        """Cached result for this question and retrieval, or None"""
+        self._expire()
+        key = self._query_key(query)
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] == digest:
+            self._entries.move_to_end(key)
+            return entry[2]
+
+        # Semantic match over the (small) set of cached questions
+        candidates = [(k, e) for k, e in self._entries.items() if e[1] == digest]
+        if not candidates:
+            return None
+
+        vectors = np.stack([e[0] for _, e in candidates])
+        scores = vectors @ query_embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+
+        best_key = candidates[best][0]
+        self._entries.move_to_end(best_key)
+        return candidates[best][1][2]
+
+    def set(self, query: str, query_embedding: np.ndarray, digest: str, result: Dict):
+        key = self._query_key(query)
+        self._entries[key] = (query_embedding, digest, result, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _expire(self):
+        """Drop entries older than the TTL"""
+        cutoff = time.monotonic() - self.ttl_seconds
+        for key in [k for k, e in self._entries.items() if e[3] < cutoff]:
+            del self._entries[key]
@@ -2,14 +2,20 @@
 Index chat messages into vector database
 """
 
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
-from typing import Dict, List
+from typing import Dict, Iterator, List, Tuple
 from rag.vector_store import VectorStore
-from rag.embeddings import EmbeddingModel
-from core.preprocessor import normalize_text
+from rag.embeddings import get_embedding_model
+from core.preprocessor import normalize_series
 import streamlit as st
 
+# Messages embedded per chunk; the next chunk is embedded while the previous one is added to FAISS
+INDEX_CHUNK_SIZE = 4096
+
 class ChatIndexer:
     """Index and manage chat messages in vector store"""
     
@@ -19,7 +25,7 @@ class ChatIndexer:
         Args:
             index_name: optional name to namespace the FAISS index for a chat
         """
-        self.embedding_model = EmbeddingModel()
+        self.embedding_model = get_embedding_model()
         self.vector_store = VectorStore(dimension=self.embedding_model.get_dimension(), index_name=index_name)
         self.indexed_message_ids = set()
     
@@ -34,44 +40,33 @@ class ChatIndexer:
             True if indexing successful
         """
         try:
-            # Filter out system messages and media
-            df_clean = df[
-                (df['user'] != 'group_notification') & 
-                (df['message'] != '<Media omitted>') &
-                (df['message'].str.strip() != '')
-            ].copy()
+            # Filter out system messages and media: one mask on the raw arrays,
+            # stripping only the rows that passed the cheap checks, then one gather
+            mask = (
+                (df['user'].to_numpy() != 'group_notification')
+                & (df['message'].to_numpy() != '<Media omitted>')
+            )
+            candidates = np.flatnonzero(mask)
+            if len(candidates) > 0:
+                blank = df['message'].iloc[candidates].str.strip().eq('').to_numpy()
+                mask[candidates[blank]] = False
+            df_clean = df[mask]
             
             if len(df_clean) == 0:
                 st.warning("No messages to index")
                 return False
             
-            # Generate embeddings
+            # Embed, build metadata and add to the vector DB chunk by chunk, so at most
+            # a few chunks of embeddings and intermediate frames are alive at a time
             st.info(f"Generating embeddings for {len(df_clean)} messages...")
-            texts_to_embed = [
-                normalize_text(msg) if isinstance(msg, str) else "" 
-                for msg in df_clean['message']
-            ]
-            
-            embeddings = self.embedding_model.embed_batch(texts_to_embed)
+            progress = st.progress(0.0)
+            for start, embeddings in self._embed_chunks(df_clean['message']):
+                end = start + len(embeddings)
+                self.vector_store.add(embeddings, self._build_metadata(df_clean.iloc[start:end]))
+                progress.progress(end / len(df_clean))
             
-            # Prepare metadata
-            metadata = []
-            for idx, row in df_clean.iterrows():
-                metadata.append({
-                    'message_id': row['message_id'],
-                    'user': row['user'],
-                    'date': row['date'].isoformat(),
-                    'only_date': str(row['only_date']),
-                    'language': row['language'],
-                    'message': row['message'],
-                    'message_length': row['message_length'],
-                    'hour': int(row['hour']),
-                    'day_name': row['day_name']
-                })
-            
-            # Store in vector DB
             st.info("Storing embeddings in vector database...")
-            self.vector_store.store_embeddings(embeddings, metadata)
+            self.vector_store.save()
             
             st.success(f"✓ Successfully indexed {len(df_clean)} messages")
             return True
@@ -80,6 +75,66 @@ class ChatIndexer:
             st.error(f"Error indexing chat data: {str(e)}")
             return False
     
+    @staticmethod
+    def _build_metadata(chunk: pd.DataFrame) -> List[Dict]:
+        """
+        Metadata dicts for a chunk of messages: column-wise conversions, then one records pass
+        
+        Only the fields retrieval and the QA prompt read; the rest are
+        derivable from 'date' / 'message' and would only enlarge metadata.json
+        """
+        return pd.DataFrame({
+            'message_id': chunk['message_id'],
+            'user': chunk['user'],
+            'date': chunk['date'].dt.strftime('%Y-%m-%dT%H:%M:%S'),
+            'message': chunk['message']
+        }).to_dict(orient='records')
+    
+    def _embed_chunks(self, messages: pd.Series, chunk_size: int = INDEX_CHUNK_SIZE) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Yield (start offset, embeddings of the normalized messages) per chunk, in order
+        
+        Chunks are embedded on a worker thread, at most two ahead of the consumer,
+        so the caller's FAISS adds overlap with embedding the next chunk.
+        """
+        chunks = queue.Queue(maxsize=2)
+        stop = threading.Event()
+        done = object()
+        
+        def _put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def _produce():
+            try:
+                for start in range(0, len(messages), chunk_size):
+                    texts = normalize_series(messages.iloc[start:start + chunk_size]).tolist()
+                    embeddings = self.embedding_model.embed_batch(texts)
+                    if not _put((start, embeddings)):
+                        return
+                _put(done)
+            except Exception as e:
+                _put(e)
+        
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pool.submit(_produce)
+            try:
+                while True:
+                    item = chunks.get()
+                    if item is done:
+                        return
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                # Unblock the producer if the consumer stopped early
+                stop.set()
+    
     def get_index_stats(self) -> Dict:
         """Get indexing statistics"""
         return self.vector_store.get_stats()
\ No newline at end of file
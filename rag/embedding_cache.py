@@ -0,0 +1,92 @@
+"""
+Persistent content-addressed cache of message embeddings (SQLite)
+Repeated messages ("ok", "lol", links) and re-indexing the same chat skip the model
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, List
+
+import numpy as np
+
+from config.settings import ENABLE_CACHING, EMBEDDING_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+# SQLite's default limit on bound parameters per statement is 999
+_QUERY_CHUNK = 900
+
+
+def text_key(text: str) -> bytes:
+    """Cache key of one (normalized) text"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    """Text hash -> float32 vector store for one model, safe to share across Streamlit sessions"""
+
+    def __init__(self, namespace: str, dimension: int, path: str = EMBEDDING_CACHE_PATH, enabled: bool = ENABLE_CACHING):
+        self.namespace = namespace
+        self.dimension = dimension
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if not self.enabled:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(namespace TEXT NOT NULL, key BLOB NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning("Embedding cache disabled, could not open %s: %s", path, e)
+            self.enabled = False
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Cached vectors for the keys that have one"""
+        if not self.enabled or not keys:
+            return {}
+
+        found = {}
+        try:
+            with self._lock:
+                for start in range(0, len(keys), _QUERY_CHUNK):
+                    chunk = keys[start:start + _QUERY_CHUNK]
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE namespace = ? "
+                        f"AND key IN ({','.join('?' * len(chunk))})",
+                        (self.namespace, *chunk)
+                    ).fetchall()
+                    for key, vector in rows:
+                        found[bytes(key)] = np.frombuffer(vector, dtype=np.float32)
+        except sqlite3.Error as e:
+            logger.warning("Embedding cache read failed: %s", e)
+            return {}
+
+        # Ignore vectors written by a model with a different dimension
+        return {key: vec for key, vec in found.items() if vec.shape[0] == self.dimension}
+
+    def set_many(self, keys: List[bytes], vectors: np.ndarray):
+        """Store one float32 vector per key"""
+        if not self.enabled or not keys:
+            return
+
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        try:
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (namespace, key, vector) VALUES (?, ?, ?)",
+                    [(self.namespace, key, vector.tobytes()) for key, vector in zip(keys, vectors)]
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning("Embedding cache write failed: %s", e)
@@ -2,10 +2,20 @@
 Embedding model using sentence-transformers (Local model)
 """
 
-from sentence_transformers import SentenceTransformer
+import logging
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 import numpy as np
-from typing import List, Union
-from config. settings import EMBEDDING_MODEL, EMBEDDING_DIMENSION
+from typing import List, Optional, Union
+from config.settings import EMBEDDING_MODEL, EMBEDDING_DIMENSION, EMBEDDING_INT8_ON_CPU
+from rag.embedding_cache import EmbeddingCache, text_key
+
+logger = logging.getLogger(__name__)
+
+# Recent query embeddings kept in memory (retries, repeated questions)
+QUERY_EMBEDDING_CACHE_SIZE = 512
 
 class EmbeddingModel: 
     """Generate embeddings using local sentence-transformers model"""
@@ -17,44 +27,119 @@ class EmbeddingModel:
         Args:
             model_name: HuggingFace model identifier (downloads once, then cached)
         """
-        self. model_name = model_name
+        # torch / sentence-transformers take seconds to import, so they load with the first model
+        import torch
+        
+        self.model_name = model_name
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
         # Load model locally - no token needed
-        self.model = SentenceTransformer(model_name)
+        self.precision = "fp32"
+        self.model = self._load_model(model_name)
         self.dimension = EMBEDDING_DIMENSION
+        # Vectors differ slightly between precisions, so each gets its own namespace
+        self.cache = EmbeddingCache(f"{model_name}:{self.precision}", self.dimension)
+        self._recent = OrderedDict()
+        self._recent_lock = threading.Lock()
+
+    def _load_model(self, model_name: str):
+        """Half precision on GPU, int8 linear layers on CPU (full FP32 if either fails)"""
+        import torch
+        from sentence_transformers import SentenceTransformer
+        
+        if self.device == "cuda":
+            try:
+                model = SentenceTransformer(model_name, device="cuda", model_kwargs={"torch_dtype": torch.float16})
+                self.precision = "fp16"
+                return model
+            except Exception as e:
+                logger.warning("FP16 load failed, using FP32: %s", e)
+                return SentenceTransformer(model_name, device="cuda")
+
+        model = SentenceTransformer(model_name, device="cpu")
+        if EMBEDDING_INT8_ON_CPU:
+            try:
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                self.precision = "int8"
+            except Exception as e:
+                logger.warning("Int8 quantization unavailable, using FP32: %s", e)
+        return model
     
     def embed_text(self, text:  str) -> np.ndarray:
         """
-        Embed a single text
+        Embed a single text (recent texts are served from memory)
         
         Args: 
             text: text to embed
         
         Returns:
-            embedding vector of shape (dimension,)
+            unit-length embedding vector of shape (dimension,), read-only
         """
         if not text or not isinstance(text, str):
             return np.zeros(self. dimension, dtype=np.float32)
         
-        embedding = self.model.encode(text, convert_to_numpy=True)
-        return embedding. astype(np.float32)
+        with self._recent_lock:
+            embedding = self._recent.get(text)
+            if embedding is not None:
+                self._recent.move_to_end(text)
+                return embedding
+        
+        embedding = self.model.encode(text, convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
+        # Shared between callers, so it must not be modified in place
+        embedding.setflags(write=False)
+        
+        with self._recent_lock:
+            self._recent[text] = embedding
+            while len(self._recent) > QUERY_EMBEDDING_CACHE_SIZE:
+                self._recent.popitem(last=False)
+        return embedding
     
-    def embed_batch(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+    def embed_batch(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
         """
-        Embed multiple texts
+        Embed multiple texts, encoding only distinct texts not already in the cache
         
         Args: 
             texts: list of texts to embed
-            batch_size: batch size for processing
+            batch_size: batch size for processing (default: sized for the device)
         
         Returns: 
-            embedding matrix of shape (n_texts, dimension)
+            embedding matrix of shape (n_texts, dimension), rows of unit length
         """
         # Filter out empty texts
         texts = [t if isinstance(t, str) else "" for t in texts]
         
-        embeddings = self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
-        return embeddings. astype(np.float32)
+        if batch_size is None:
+            batch_size = self._default_batch_size()
+
+        keys = [text_key(t) for t in texts]
+        unique = dict(zip(keys, texts))
+        vectors = self.cache.get_many(list(unique))
+
+        missing = [key for key in unique if key not in vectors]
+        if missing:
+            # sentence-transformers sorts the texts by length internally, so each batch pads little
+            fresh = self.model.encode(
+                [unique[key] for key in missing], batch_size=batch_size, convert_to_numpy=True,
+                normalize_embeddings=True, show_progress_bar=False
+            ).astype(np.float32)
+            self.cache.set_many(missing, fresh)
+            vectors.update(zip(missing, fresh))
+
+        if not keys:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return np.stack([vectors[key] for key in keys])
     
+    def _default_batch_size(self) -> int:
+        """Larger batches keep the GPU / all CPU cores busy on short chat messages"""
+        if self.device == "cuda":
+            return 256
+        return min(256, max(32, (os.cpu_count() or 4) * 8))
+
     def get_dimension(self) -> int:
         """Get embedding dimension"""
         return self.dimension
+
+
+@lru_cache(maxsize=4)
+def get_embedding_model(model_name: str = EMBEDDING_MODEL) -> EmbeddingModel:
+    """Process-wide EmbeddingModel per model name, so the weights load only once"""
+    return EmbeddingModel(model_name)
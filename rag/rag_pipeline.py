@@ -5,8 +5,11 @@ WITH IMPROVED ERROR HANDLING FOR SAFETY BLOCKS
 
 from typing import Dict, List, Optional, Tuple
 from rag.retriever import ChatRetriever
-from llm.mistral_client import MistralClient
+from llm.mistral_client import get_mistral_client
 from llm.prompt_templates import get_qa_prompt
+from rag.answer_cache import AnswerCache, retrieval_digest
+import asyncio
+import numpy as np
 import time
 
 class RAGPipeline: 
@@ -19,8 +22,9 @@ class RAGPipeline:
             index_name: optional chat-specific FAISS index namespace
         """
         self.retriever = ChatRetriever(index_name=index_name)
-        self.llm = MistralClient()
+        self.llm = get_mistral_client()
         self.context_window = 10
+        self.answer_cache = AnswerCache()
     
     def answer_question(
         self,
@@ -42,106 +46,166 @@ class RAGPipeline:
         start_time = time.time()
         
         try:
-            # Validate query
-            if not query or not query.strip():
-                return {
-                    "answer": "Please ask a valid question.",
-                    "citations": [],
-                    "confidence": 0.0,
-                    "sources_count": 0,
-                    "processing_time": time.time() - start_time
-                }
-            
-            # Step 1: Retrieve relevant messages
-            retrieved_messages = self.retriever. retrieve_by_query(
-                query,
-                top_k=top_k,
-                date_range=date_range,
-                include_context=True,
-                context_size=self.context_window
-            )
-            
-            if not retrieved_messages:
-                return {
-                    "answer": "I couldn't find relevant information in the specified date range.",
-                    "citations":  [],
-                    "confidence": 0.0,
-                    "sources_count": 0,
-                    "processing_time": time.time() - start_time
-                }
-            
-            # Step 1. 5: Add surrounding messages for better context
-            messages_with_context = []
-            for msg in retrieved_messages:
-                context_msgs = msg.get('context_messages')
-                if not context_msgs:
-                    context_msgs = self.retriever.get_context_around_message(
-                        msg. get('message_id', ''),
-                        context_size=self.context_window
-                    )
-                if not context_msgs:
-                    context_msgs = [msg]
-                messages_with_context. extend(context_msgs)
-            
-            # Deduplicate while preserving order
-            seen_ids = set()
-            unique_messages = []
-            for msg in messages_with_context:
-                msg_id = msg.get('message_id', '')
-                if msg_id not in seen_ids: 
-                    seen_ids.add(msg_id)
-                    unique_messages.append(msg)
-            
-            # Use messages with context if available
-            final_messages = unique_messages if unique_messages else retrieved_messages
-            
-            # Step 2: Generate prompt with context
-            prompt = get_qa_prompt(query, final_messages)
+            result, state = self._prepare(query, date_range, top_k, start_time)
+            if result is not None:
+                return result
             
             # Step 3: Generate answer
-            answer = self.llm.generate_text(prompt)
-            
-            # Check if response was blocked or errored
-            if answer.startswith("[Error"):
-                return {
-                    "answer": "Unable to generate answer due to an error. Please try again.",
-                    "citations": self._format_citations(retrieved_messages),
-                    "confidence": 0.5,
-                    "sources_count": len(retrieved_messages),
-                    "processing_time": time.time() - start_time
-                }
+            answer = self.llm.generate_text(state["prompt"])
+            return self._finish(query, answer, state, start_time)
+        
+        except Exception as e: 
+            return self._error_result(e, start_time)
+    
+    async def answer_question_async(
+        self,
+        query: str,
+        date_range: Optional[Tuple[str, str]] = None,
+        top_k: int = 5
+    ) -> Dict:
+        """
+        Async counterpart of answer_question (retrieval runs in a worker thread)
+        
+        The LLM's async connection pool belongs to the running event loop;
+        await self.llm.aclose() before that loop is closed.
+        """
+        start_time = time.time()
+        
+        try:
+            result, state = await asyncio.to_thread(self._prepare, query, date_range, top_k, start_time)
+            if result is not None:
+                return result
             
-            # Step 4: Format response
+            answer = await self.llm.generate_text_async(state["prompt"])
+            return self._finish(query, answer, state, start_time)
+        
+        except Exception as e:
+            return self._error_result(e, start_time)
+    
+    def _prepare(
+        self,
+        query: str,
+        date_range: Optional[Tuple[str, str]],
+        top_k: int,
+        start_time: float
+    ) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """
+        Everything before the LLM call
+        
+        Returns:
+            (final result, None) when no LLM call is needed (invalid query,
+            nothing retrieved, cached answer), else (None, state for _finish)
+        """
+        # Validate query
+        if not query or not query.strip():
             return {
-                "answer": answer,
-                "citations": self._format_citations(retrieved_messages),
-                "confidence": self._estimate_confidence(retrieved_messages),
-                "sources_count": len(retrieved_messages),
+                "answer": "Please ask a valid question.",
+                "citations": [],
+                "confidence": 0.0,
+                "sources_count": 0,
                 "processing_time": time.time() - start_time
-            }
+            }, None
         
-        except Exception as e: 
-            print(f"[RAG Pipeline Error] {e}")
+        # Step 1: Retrieve relevant messages
+        query_embedding = self.retriever.embedding_model.embed_text(query)
+        retrieved_messages = self.retriever.retrieve_by_query(
+            query,
+            top_k=top_k,
+            date_range=date_range,
+            include_context=True,
+            context_size=self.context_window,
+            query_embedding=query_embedding
+        )
+        
+        if not retrieved_messages:
             return {
-                "answer": f"Error processing question: {str(e)}",
-                "citations":  [],
+                "answer": "I couldn't find relevant information in the specified date range.",
+                "citations": [],
                 "confidence": 0.0,
                 "sources_count": 0,
                 "processing_time": time.time() - start_time
+            }, None
+        
+        # Same (or reworded) question over the same retrieved messages
+        digest = retrieval_digest(
+            (msg.get('message_id', '') for msg in retrieved_messages), date_range
+        )
+        cached = self.answer_cache.get(query, query_embedding, digest)
+        if cached is not None:
+            return {**cached, "processing_time": time.time() - start_time}, None
+        
+        # Step 1.5: Add surrounding messages for better context (the retriever
+        # already attached them; a hit without any stands in for itself)
+        messages_with_context = []
+        for msg in retrieved_messages:
+            messages_with_context.extend(msg.get('context_messages') or [msg])
+        
+        # Deduplicate while preserving order (nothing to do if no context was added)
+        if len(messages_with_context) == len(retrieved_messages):
+            unique_messages = messages_with_context
+        else:
+            unique_messages = list({
+                msg.get('message_id') or id(msg): msg for msg in messages_with_context
+            }.values())
+        
+        # Use messages with context if available
+        final_messages = unique_messages if unique_messages else retrieved_messages
+        
+        # Step 2: Generate prompt with context
+        return None, {
+            "prompt": get_qa_prompt(query, final_messages),
+            "query_embedding": query_embedding,
+            "retrieved_messages": retrieved_messages,
+            "digest": digest
+        }
+    
+    def _finish(self, query: str, answer: str, state: Dict, start_time: float) -> Dict:
+        """Steps after the LLM call: format the response and cache it"""
+        retrieved_messages = state["retrieved_messages"]
+        
+        # Check if response was blocked or errored
+        if answer.startswith("[Error"):
+            return {
+                "answer": "Unable to generate answer due to an error. Please try again.",
+                "citations": self._format_citations(retrieved_messages),
+                "confidence": 0.5,
+                "sources_count": len(retrieved_messages),
+                "processing_time": time.time() - start_time
             }
+        
+        # Step 4: Format response
+        result = {
+            "answer": answer,
+            "citations": self._format_citations(retrieved_messages),
+            "confidence": self._estimate_confidence(retrieved_messages),
+            "sources_count": len(retrieved_messages),
+            "processing_time": time.time() - start_time
+        }
+        self.answer_cache.set(query, state["query_embedding"], state["digest"], result)
+        return result
+    
+    def _error_result(self, error: Exception, start_time: float) -> Dict:
+        print(f"[RAG Pipeline Error] {error}")
+        return {
+            "answer": f"Error processing question: {str(error)}",
+            "citations": [],
+            "confidence": 0.0,
+            "sources_count": 0,
+            "processing_time": time.time() - start_time
+        }
     
     def _format_citations(self, messages: List[Dict]) -> List[Dict]:
         """Format retrieved messages as citations"""
-        citations = []
-        for i, msg in enumerate(messages[: 10], 1):  # Limit to top 10
-            citations.append({
+        return [
+            {
                 "id": i,
-                "user":  msg.get("user", "Unknown"),
+                "user": msg.get("user", "Unknown"),
                 "message": msg.get("message", ""),
-                "timestamp": msg. get("date", ""),
-                "score": round(msg.get("score", 0.0), 3)
-            })
-        return citations
+                "timestamp": msg.get("date", ""),
+                "score": round(float(msg.get("similarity_score", 0.0)), 3)
+            }
+            for i, msg in enumerate(messages[:10], 1)  # Limit to top 10
+        ]
     
     def _estimate_confidence(self, messages: List[Dict]) -> float:
         """Estimate confidence based on retrieval scores"""
@@ -149,11 +213,10 @@ class RAGPipeline:
             return 0.0
         
         # Average of top 3 scores
-        top_scores = [msg.get("score", 0.0) for msg in messages[: 3]]
-        if not top_scores:
-            return 0.5
-        
-        avg_score = sum(top_scores) / len(top_scores)
-        # Normalize to 0-1 range (scores are typically 0-2 for cosine similarity)
-        confidence = min(avg_score / 2.0, 1.0)
+        top = messages[:3]
+        scores = np.fromiter(
+            (msg.get("similarity_score", 0.0) for msg in top), dtype=np.float32, count=len(top)
+        )
+        # Scores are cosine similarities of unit vectors; negative ones mean no match
+        confidence = float(np.clip(scores.mean(), 0.0, 1.0))
         return round(confidence, 2)
@@ -5,7 +5,7 @@ Retrieve relevant messages from vector store
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 from rag.vector_store import VectorStore
-from rag.embeddings import EmbeddingModel
+from rag.embeddings import get_embedding_model
 from config.settings import RAG_TOP_K_MESSAGES
 import numpy as np
 
@@ -18,7 +18,7 @@ class ChatRetriever:
         Args:
             index_name: optional chat-specific FAISS namespace
         """
-        self.embedding_model = EmbeddingModel()
+        self.embedding_model = get_embedding_model()
         self.vector_store = VectorStore(
             dimension=self.embedding_model.get_dimension(),
             index_name=index_name
@@ -30,7 +30,8 @@ class ChatRetriever:
         top_k: int = RAG_TOP_K_MESSAGES,
         date_range: Optional[Tuple[str, str]] = None,
         include_context: bool = False,
-        context_size: int = 10
+        context_size: int = 10,
+        query_embedding: Optional[np.ndarray] = None
     ) -> List[Dict]:
         """
         Retrieve messages similar to query
@@ -39,6 +40,7 @@ class ChatRetriever:
             query: search query
             top_k: number of results
             date_range: optional (start_date, end_date) tuple in YYYY-MM-DD format
+            query_embedding: precomputed embedding of query, if the caller has one
         
         Returns:
             List of retrieved message metadata
@@ -48,39 +50,67 @@ class ChatRetriever:
                 return []
             
             # Generate query embedding
-            query_embedding = self.embedding_model.embed_text(query)
-            
-            # Retrieve from vector store
-            retrieved = self.vector_store.retrieve_similar(query_embedding, top_k=top_k * 2)
-            
-            # Filter by date range if provided
-            if date_range:
-                start_date, end_date = date_range
-                retrieved = [
-                    msg for msg in retrieved 
-                    if 'date' in msg and start_date <= msg['date'] <= end_date
-                ]
+            if query_embedding is None:
+                query_embedding = self.embedding_model.embed_text(query)
             
-            # Return top_k after filtering
-            retrieved = retrieved[:top_k]
-
-            if include_context and context_size > 0:
-                for msg in retrieved:
-                    msg_id = msg.get('message_id', '')
-                    if msg_id:
-                        msg['context_messages'] = self.get_context_around_message(
-                            msg_id,
-                            context_size=context_size
-                        )
-                    else:
-                        msg['context_messages'] = []
-
-            return retrieved
+            # Retrieve from vector store, only among messages in the date range
+            retrieved = self.vector_store.retrieve_similar(
+                query_embedding, top_k=top_k, positions=self._date_filter(date_range)
+            )
+            return self._with_context(retrieved, include_context, context_size)
         
         except Exception as e:
             print(f"[DEBUG] Error in retrieve_by_query: {str(e)}")
             raise
     
+    def retrieve_by_queries(
+        self,
+        queries: List[str],
+        top_k: int = RAG_TOP_K_MESSAGES,
+        date_range: Optional[Tuple[str, str]] = None,
+        include_context: bool = False,
+        context_size: int = 10
+    ) -> List[List[Dict]]:
+        """
+        retrieve_by_query for several queries: one embedding batch and one FAISS search
+        
+        Returns:
+            One list of retrieved message metadata per query (empty for blank queries)
+        """
+        valid = [i for i, query in enumerate(queries) if query and query.strip()]
+        results = [[] for _ in queries]
+        if not valid:
+            return results
+        
+        query_embeddings = self.embedding_model.embed_batch([queries[i] for i in valid])
+        batch = self.vector_store.retrieve_similar_batch(
+            query_embeddings, top_k=top_k, positions=self._date_filter(date_range)
+        )
+        for i, retrieved in zip(valid, batch):
+            results[i] = self._with_context(retrieved, include_context, context_size)
+        return results
+    
+    def _date_filter(self, date_range: Optional[Tuple[str, str]]) -> Optional[np.ndarray]:
+        """Index positions inside date_range, or None for no restriction"""
+        if not date_range:
+            return None
+        return self.vector_store.date_positions(*date_range)
+    
+    def _with_context(self, retrieved: List[Dict], include_context: bool, context_size: int) -> List[Dict]:
+        """Attach the surrounding messages to each hit"""
+        if include_context and context_size > 0:
+            for msg in retrieved:
+                msg_id = msg.get('message_id', '')
+                if msg_id:
+                    msg['context_messages'] = self.get_context_around_message(
+                        msg_id,
+                        context_size=context_size
+                    )
+                else:
+                    msg['context_messages'] = []
+
+        return retrieved
+    
     def retrieve_by_date_range(
         self,
         start_date: str,
@@ -96,21 +126,14 @@ class ChatRetriever:
         Returns:
             List of messages in date range
         """
-        # Get all messages from metadata
         all_messages = self.vector_store.metadata
-        
-        filtered = [
-            msg for msg in all_messages
-            if start_date <= msg['date'] <= end_date
-        ]
-        
-        return filtered
+        return [all_messages[i] for i in self.vector_store.date_positions(start_date, end_date)]
     
     def retrieve_by_user(self, user: str, top_k: int = 100) -> List[Dict]:
         """Retrieve messages by specific user"""
         all_messages = self.vector_store.metadata
-        user_messages = [msg for msg in all_messages if msg['user'] == user]
-        return user_messages[:top_k]
+        matches = np.flatnonzero(self.vector_store.column('user') == user)[:top_k]
+        return [all_messages[i] for i in matches]
     
     def get_context_around_message(
         self, 
@@ -130,12 +153,7 @@ class ChatRetriever:
         metadata = self.vector_store.metadata
         
         # Find target message index
-        target_idx = None
-        for idx, msg in enumerate(metadata):
-            if msg['message_id'] == message_id:
-                target_idx = idx
-                break
-        
+        target_idx = self.vector_store.position_of(message_id)
         if target_idx is None:
             return []
         
@@ -3,27 +3,52 @@ FAISS Vector Database operations
 """
 
 import faiss
+import json
+import logging
 import numpy as np
 import pickle
 import os
+import re
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
-from config.settings import FAISS_INDEX_PATH
+from config.settings import (
+    FAISS_INDEX_PATH, VECTOR_INDEX_TYPE, HNSW_MIN_VECTORS,
+    HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, VECTOR_STORAGE
+)
+
+try:
+    import orjson
+except ImportError:  # optional speedup, stdlib json works the same
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Characters not allowed in an index directory name (keeps alphanumerics, underscore, hyphen)
+_SAFE_NAME_RE = re.compile(r'[^\w\-]', re.UNICODE)
+
+# Upper bound on efSearch for a date-filtered HNSW search
+_MAX_FILTERED_EF_SEARCH = 1024
 
 class VectorStore:
     """Manage FAISS vector index and metadata"""
     
-    def __init__(self, dimension: int = 768, index_name: str = None):
+    def __init__(self, dimension: int = 768, index_name: str = None, index_type: str = VECTOR_INDEX_TYPE):
         """Initialize FAISS vector store
 
         Args:
             dimension: embedding dimension
             index_name: optional name/namespace for per-chat indexes. If provided,
                         index files are stored under FAISS_INDEX_PATH/index_name/
+            index_type: "hnsw" to switch to an HNSW graph once the index holds
+                        HNSW_MIN_VECTORS vectors, "flat" for exact search only
         """
         self.dimension = dimension
+        self.index_type = index_type
         self.index = None
         self.metadata = []
+        self._id_to_idx = {}
+        self._columns = {}
+        self._dirty = False
         self.is_trained = False
 
         # Convert to absolute path to avoid relative path issues with FAISS
@@ -32,13 +57,9 @@ class VectorStore:
 
         # Use a subdirectory per index_name when provided to avoid collisions
         if index_name:
-            # Remove special characters and emojis for filesystem compatibility
-            import re
-            safe_name = str(index_name).replace(' ', '_')
-            # Keep only alphanumeric, underscore, and hyphen
-            safe_name = re.sub(r'[^\w\-]', '', safe_name, flags=re.UNICODE)
-            # Remove any leading/trailing underscores or hyphens
-            safe_name = safe_name.strip('_-') or 'chat'
+            # Remove special characters and emojis for filesystem compatibility,
+            # then any leading/trailing underscores or hyphens
+            safe_name = _SAFE_NAME_RE.sub('', str(index_name).replace(' ', '_')).strip('_-') or 'chat'
             self.index_dir = str(base_path / safe_name)
         else:
             self.index_dir = str(base_path / "default")
@@ -47,38 +68,124 @@ class VectorStore:
         
         # Use Path to ensure consistent path handling across platforms, convert to forward slashes
         self.index_path = str(Path(self.index_dir) / "index.faiss").replace('\\', '/')
-        self.metadata_path = str(Path(self.index_dir) / "metadata.pkl").replace('\\', '/')
+        self.metadata_path = str(Path(self.index_dir) / "metadata.json").replace('\\', '/')
+        # Metadata format before it moved to JSON; read once and migrated
+        self.legacy_metadata_path = str(Path(self.index_dir) / "metadata.pkl").replace('\\', '/')
 
         self._load_or_create()
     
     def _load_or_create(self):
         """Load existing index or create new one"""
-        if os.path.exists(self.index_path) and os.path.exists(self.metadata_path):
+        if os.path.exists(self.index_path) and (
+            os.path.exists(self.metadata_path) or os.path.exists(self.legacy_metadata_path)
+        ):
             self._load_index()
         else:
             self._create_index()
     
     def _create_index(self):
-        """Create new FAISS index"""
-        self.index = faiss.IndexFlatL2(self.dimension)
+        """Create new FAISS index (inner product == cosine similarity on unit vectors)"""
+        self.index = self._new_flat_index(self.dimension)
         self.metadata = []
+        self._id_to_idx = {}
+        self._columns = {}
         self.is_trained = True
     
+    @staticmethod
+    def _new_flat_index(dimension: int):
+        """Exact inner-product index, storing vectors in VECTOR_STORAGE precision"""
+        if VECTOR_STORAGE == "fp16":
+            # Unit-length sentence embeddings lose nothing measurable in half precision
+            return faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+        return faiss.IndexFlatIP(dimension)
+    
+    @staticmethod
+    def _new_hnsw_index(dimension: int, vectors: np.ndarray):
+        """HNSW inner-product index (VECTOR_STORAGE precision) holding vectors"""
+        if VECTOR_STORAGE == "fp16":
+            index = faiss.IndexHNSWSQ(dimension, faiss.ScalarQuantizer.QT_fp16, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+        else:
+            index = faiss.IndexHNSWFlat(dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        index.add(vectors)
+        return index
+    
     def _load_index(self):
-        """Load existing FAISS index"""
+        """Load existing FAISS index, then bring files in older formats up to date"""
         try:
             # Convert to absolute path with forward slashes for FAISS compatibility
             index_path_absolute = str(Path(self.index_path).resolve()).replace('\\', '/')
-            metadata_path_absolute = str(Path(self.metadata_path).resolve())
             
             self.index = faiss.read_index(index_path_absolute)
-            with open(metadata_path_absolute, 'rb') as f:
-                self.metadata = pickle.load(f)
+            self.metadata = self._read_metadata()
+            self._id_to_idx = {msg['message_id']: idx for idx, msg in enumerate(self.metadata)}
+            self._columns = {}
             self.is_trained = True
         except Exception as e:
-            print(f"Error loading index: {e}. Creating new index.")
+            logger.error("Error loading index: %s. Creating new index.", e)
             self._create_index()
+            return
+        
+        # The loaded index is usable as is, so a failed migration only leaves
+        # the old files in place to be retried on the next load
+        try:
+            if self.index.metric_type != faiss.METRIC_INNER_PRODUCT:
+                self._migrate_to_inner_product()
+            if isinstance(self.index, faiss.IndexHNSW):
+                self.index.hnsw.efSearch = HNSW_EF_SEARCH
+            elif self._maybe_convert_to_hnsw():
+                # Large indexes saved while still flat are converted once, on load
+                self._save_index()
+            if os.path.exists(self.legacy_metadata_path):
+                self._migrate_metadata_to_json()
+        except Exception as e:
+            logger.warning("Index migration failed, keeping the existing files: %s", e)
+    
+    def _migrate_metadata_to_json(self):
+        """Write metadata.json and remove metadata.pkl once the JSON reads back intact"""
+        self._save_index()
+        try:
+            migrated = self._read_metadata()
+            if [m.get('message_id') for m in migrated] != [m.get('message_id') for m in self.metadata]:
+                raise ValueError("metadata.json does not match metadata.pkl")
+        except Exception:
+            # Without the JSON file the pickle stays the one that gets loaded
+            os.remove(self.metadata_path)
+            raise
+        self.metadata = migrated
+        os.remove(self.legacy_metadata_path)
+    
+    def _read_metadata(self) -> List[Dict]:
+        """Metadata list from metadata.json, or from the legacy pickle if that's all there is"""
+        if os.path.exists(self.metadata_path):
+            with open(self.metadata_path, 'rb') as f:
+                data = f.read()
+            return orjson.loads(data) if orjson is not None else json.loads(data)
+        
+        with open(self.legacy_metadata_path, 'rb') as f:
+            return pickle.load(f)
     
+    def _migrate_to_inner_product(self):
+        """Rebuild an index saved with the old L2 metric as a cosine (inner product) index"""
+        vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        faiss.normalize_L2(vectors)
+        index = self._new_flat_index(vectors.shape[1])
+        index.add(vectors)
+        self.index = index
+        self._save_index()
+
+    def _maybe_convert_to_hnsw(self) -> bool:
+        """Rebuild a flat index as HNSW once it is large enough for exact search to be slow"""
+        if (self.index_type != "hnsw" or isinstance(self.index, faiss.IndexHNSW)
+                or self.index.ntotal < HNSW_MIN_VECTORS):
+            return False
+        
+        vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        self.index = self._new_hnsw_index(vectors.shape[1], vectors)
+        return True
+
     def _save_index(self):
         """Save FAISS index and metadata"""
         if self.index is not None:
@@ -86,13 +193,22 @@ class VectorStore:
             index_path_absolute = str(Path(self.index_path).resolve()).replace('\\', '/')
             metadata_path_absolute = str(Path(self.metadata_path).resolve())
             
-            faiss.write_index(self.index, index_path_absolute)
-            with open(metadata_path_absolute, 'wb') as f:
-                pickle.dump(self.metadata, f)
+            # Write to temporary files and swap them in, so an interrupted save
+            # never leaves a truncated index or metadata file behind
+            faiss.write_index(self.index, index_path_absolute + '.tmp')
+            if orjson is not None:
+                data = orjson.dumps(self.metadata, option=orjson.OPT_SERIALIZE_NUMPY, default=str)
+            else:
+                data = json.dumps(self.metadata, ensure_ascii=False, default=str).encode('utf-8')
+            with open(metadata_path_absolute + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(index_path_absolute + '.tmp', index_path_absolute)
+            os.replace(metadata_path_absolute + '.tmp', metadata_path_absolute)
+            self._dirty = False
     
-    def store_embeddings(self, embeddings: np.ndarray, metadata: List[Dict]):
+    def add(self, embeddings: np.ndarray, metadata: List[Dict]):
         """
-        Store embeddings in FAISS index
+        Add embeddings to the in-memory index without writing it to disk
         
         Args:
             embeddings: numpy array of shape (n_messages, dimension)
@@ -101,43 +217,167 @@ class VectorStore:
         if len(embeddings) != len(metadata):
             raise ValueError("Number of embeddings must match number of metadata entries")
         
-        # Ensure embeddings are float32 (FAISS requirement)
-        embeddings = embeddings.astype('float32')
+        # Ensure embeddings are float32 (FAISS requirement) and unit length, so
+        # inner product is cosine whatever produced them (a no-op for EmbeddingModel output)
+        embeddings = np.array(embeddings, dtype='float32', order='C')
+        faiss.normalize_L2(embeddings)
         
         # Add to index
+        offset = len(self.metadata)
         self.index.add(embeddings)
         self.metadata.extend(metadata)
+        self._id_to_idx.update((msg['message_id'], offset + i) for i, msg in enumerate(metadata))
+        self._columns = {}
+        self._dirty = True
+        self._maybe_convert_to_hnsw()
+    
+    def position_of(self, message_id: str) -> Optional[int]:
+        """Position of a message in the index / metadata list, or None if not indexed"""
+        return self._id_to_idx.get(message_id)
+    
+    def column(self, name: str) -> np.ndarray:
+        """
+        One metadata field for every vector, as a numpy string array
         
-        # Save to disk
-        self._save_index()
+        Built on first use and kept until the next add, so filters over
+        users or dates are vectorized compares instead of dict walks.
+        """
+        values = self._columns.get(name)
+        if values is None:
+            values = np.array([str(msg.get(name, '')) for msg in self.metadata], dtype=str)
+            self._columns[name] = values
+        return values
     
-    def retrieve_similar(self, query_embedding: np.ndarray, top_k: int = 5) -> List[Dict]:
+    def date_positions(self, start_date: str, end_date: str) -> np.ndarray:
+        """
+        Positions of the vectors dated within [start_date, end_date] (whole days), in index order
+        
+        Uses a day column sorted once per index state, so each range is two
+        binary searches rather than a compare over every message.
+        """
+        sorted_days = self._columns.get(('date', 'sorted'))
+        if sorted_days is None:
+            # 'YYYY-MM-DDTHH:MM:SS' -> day; missing dates become NaT, which sorts last
+            days = self.column('date').astype('U10').astype('datetime64[D]')
+            order = np.argsort(days, kind='stable')
+            sorted_days = (days[order], order)
+            self._columns[('date', 'sorted')] = sorted_days
+        
+        days, order = sorted_days
+        lo = np.searchsorted(days, np.datetime64(start_date, 'D'), side='left')
+        hi = np.searchsorted(days, np.datetime64(end_date, 'D'), side='right')
+        return np.sort(order[lo:hi])
+    
+    def save(self):
+        """Write the index and metadata to disk, if anything was added since the last save"""
+        if self._dirty:
+            self._save_index()
+    
+    def store_embeddings(self, embeddings: np.ndarray, metadata: List[Dict]):
+        """
+        Store embeddings in FAISS index and save it to disk
+        
+        Args:
+            embeddings: numpy array of shape (n_messages, dimension)
+            metadata: list of metadata dicts for each message
+        """
+        self.add(embeddings, metadata)
+        self.save()
+    
+    def retrieve_similar(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 5,
+        positions: Optional[np.ndarray] = None
+    ) -> List[Dict]:
         """
         Retrieve similar messages from index
         
         Args:
             query_embedding: embedding vector of query
             top_k: number of results to return
+            positions: optional index positions to restrict the search to
         
         Returns:
             List of metadata dicts with similarity scores
         """
-        if self.index.ntotal == 0:
-            return []
+        return self.retrieve_similar_batch(
+            np.asarray(query_embedding).reshape(1, -1), top_k=top_k, positions=positions
+        )[0]
+    
+    def retrieve_similar_batch(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 5,
+        positions: Optional[np.ndarray] = None
+    ) -> List[List[Dict]]:
+        """
+        retrieve_similar for several queries with one FAISS search
         
-        query_embedding = query_embedding.astype('float32').reshape(1, -1)
-        distances, indices = self.index.search(query_embedding, min(top_k, self.index.ntotal))
+        Args:
+            query_embeddings: array of shape (n_queries, dimension)
+            top_k: number of results per query
+            positions: optional index positions (e.g. from date_positions) to
+                       restrict the search to; others are skipped inside FAISS
         
-        results = []
-        for idx, distance in zip(indices[0], distances[0]):
-            if idx == -1:  # Invalid index
-                continue
-            
-            metadata = self.metadata[idx].copy()
-            metadata['similarity_score'] = 1.0 / (1.0 + distance)  # Convert distance to similarity
-            results.append(metadata)
+        Returns:
+            One list of metadata dicts with similarity scores per query
+        """
+        candidates = self.index.ntotal if positions is None else len(positions)
+        if candidates == 0:
+            return [[] for _ in range(len(query_embeddings))]
         
-        return results
+        query_embeddings = np.array(query_embeddings, dtype='float32', order='C')
+        faiss.normalize_L2(query_embeddings)
+        
+        k = min(top_k, candidates)
+        is_hnsw = isinstance(self.index, faiss.IndexHNSW)
+        if positions is None or candidates == self.index.ntotal:
+            distances, indices = self.index.search(query_embeddings, k)
+        elif is_hnsw and candidates <= HNSW_MIN_VECTORS:
+            # A graph walk finds few matches when most nodes are filtered out;
+            # a subset this small is scored exactly for about the same cost
+            distances, indices = self._search_subset(query_embeddings, k, positions)
+        else:
+            # The bitmap must stay alive for the duration of the search
+            bitmap = np.packbits(self._position_mask(positions), bitorder='little')
+            selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+            if is_hnsw:
+                # Search parameters replace the index's own efSearch, so pass it
+                # explicitly, widened by the share of the graph the filter removes
+                ef_search = max(HNSW_EF_SEARCH, k) * max(1, self.index.ntotal // candidates)
+                params = faiss.SearchParametersHNSW(sel=selector, efSearch=min(ef_search, _MAX_FILTERED_EF_SEARCH))
+            else:
+                params = faiss.SearchParameters(sel=selector)
+            distances, indices = self.index.search(query_embeddings, k, params=params)
+            if is_hnsw and (indices == -1).any():
+                # The walk still ended before reaching k matches
+                distances, indices = self._search_subset(query_embeddings, k, positions)
+        
+        batch_results = []
+        for row_indices, row_distances in zip(indices, distances):
+            results = []
+            for idx, distance in zip(row_indices, row_distances):
+                if idx == -1:  # Invalid index
+                    continue
+                
+                # Inner product of unit vectors = cosine
+                results.append({**self.metadata[idx], 'similarity_score': float(distance)})
+            batch_results.append(results)
+        
+        return batch_results
+    
+    def _search_subset(self, query_embeddings: np.ndarray, k: int, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact top-k inner product search over the given positions only"""
+        positions = np.asarray(positions, dtype='int64')
+        scores = query_embeddings @ self.index.reconstruct_batch(positions).T
+        order = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(scores, order, axis=1), positions[order]
+    
+    def _position_mask(self, positions: np.ndarray) -> np.ndarray:
+        mask = np.zeros(self.index.ntotal, dtype=bool)
+        mask[positions] = True
+        return mask
     
     def clear_index(self):
         """Clear index and metadata"""
@@ -149,6 +389,7 @@ class VectorStore:
         return {
             "total_vectors": self.index.ntotal if self.index else 0,
             "dimension": self.dimension,
+            "index_type": type(self.index).__name__ if self.index else None,
             "is_trained": self.is_trained,
             "index_path": self.index_path
         }
\ No newline at end of file
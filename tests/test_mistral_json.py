@@ -0,0 +1,54 @@
+"""
+generate_json reads a streamed completion until its JSON object closes
+"""
+from types import SimpleNamespace
+
+import pytest
+
+import llm.mistral_client as mistral_client
+from llm.response_cache import ResponseCache
+
+
+def _event(content):
+    delta = SimpleNamespace(content=content)
+    return SimpleNamespace(data=SimpleNamespace(choices=[SimpleNamespace(delta=delta)]))
+
+
+class _FakeChat:
+    """chat.stream as in mistralai 1.2.0: a plain generator of events"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.consumed = 0
+        self.closed = False
+
+    def stream(self, **params):
+        try:
+            for chunk in self.chunks:
+                self.consumed += 1
+                yield _event(chunk)
+        finally:
+            self.closed = True
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    monkeypatch.setattr(mistral_client, "get_mistral_api_keys", lambda: ["key-1"])
+    monkeypatch.setattr(mistral_client, "get_response_cache", lambda: ResponseCache(enabled=False))
+    monkeypatch.setattr(mistral_client.MistralClient, "_configure_api", lambda self, api_key: None)
+    return mistral_client.MistralClient()
+
+
+def test_generate_json_parses_streamed_chunks(llm):
+    chat = _FakeChat(['Sure:\n```json\n{"topics": [', '{"name": "trip"}', ']}', '\n```', " Anything else?"])
+    llm.client = SimpleNamespace(chat=chat)
+
+    assert llm.generate_json("List the topics") == {"topics": [{"name": "trip"}]}
+    # Stopped at the closing brace and closed the stream
+    assert chat.consumed == 3
+    assert chat.closed
+
+
+def test_generate_json_without_json_returns_none(llm):
+    llm.client = SimpleNamespace(chat=_FakeChat(["no json here"]))
+    assert llm.generate_json("List the topics") is None
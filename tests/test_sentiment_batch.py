@@ -0,0 +1,98 @@
+"""
+analyze_by_user_batch runs its LLM calls on a new event loop on every call
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import llm.mistral_client as mistral_client
+from analytics import sentiment_analyzer
+from llm.response_cache import ResponseCache
+
+LLM_RESULT = {
+    "overall_sentiment": {"positive": 0.6, "neutral": 0.3, "negative": 0.1},
+    "emotions": {"joy": 0.5},
+    "insights": "From the LLM",
+}
+
+
+class _LoopBoundHttpClient:
+    """Stands in for httpx.AsyncClient: unusable after aclose() or on another loop"""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.closed = False
+
+    def check(self):
+        if self.closed or asyncio.get_running_loop() is not self.loop:
+            raise RuntimeError("Event loop is closed")
+
+    async def aclose(self):
+        self.closed = True
+
+
+class _FakeChat:
+    def __init__(self, http_client):
+        self.http_client = http_client
+
+    async def complete_async(self, **params):
+        self.http_client.check()
+        await asyncio.sleep(0)
+        message = SimpleNamespace(content=json.dumps(LLM_RESULT))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def _new_fake_async_client(self, api_key):
+    http_client = _LoopBoundHttpClient()
+    return SimpleNamespace(chat=_FakeChat(http_client)), http_client
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    monkeypatch.setattr(mistral_client, "get_mistral_api_keys", lambda: ["key-1", "key-2"])
+    monkeypatch.setattr(mistral_client, "get_response_cache", lambda: ResponseCache(enabled=False))
+    monkeypatch.setattr(mistral_client.MistralClient, "_configure_api", lambda self, api_key: None)
+    monkeypatch.setattr(mistral_client.MistralClient, "_new_async_client", _new_fake_async_client)
+    llm = mistral_client.MistralClient()
+
+    monkeypatch.setattr(sentiment_analyzer, "get_mistral_client", lambda: llm)
+    monkeypatch.setattr(sentiment_analyzer, "get_response_cache", lambda: ResponseCache(enabled=False))
+    return sentiment_analyzer.TimeBasedSentimentAnalyzer()
+
+
+@pytest.fixture
+def chat():
+    dates = pd.date_range("2024-01-01 09:00", periods=30, freq="h").append(
+        pd.date_range("2024-01-03 09:00", periods=30, freq="h")
+    )
+    rows = [
+        {"date": date, "user": user, "message": f"{user} message {i}"}
+        for user in ["Alice", "Bob"]
+        for i, date in enumerate(dates)
+    ]
+    df = pd.DataFrame(rows)
+    df["only_date"] = df["date"].dt.date
+    return df
+
+
+def test_batch_can_run_repeatedly(analyzer, chat):
+    users = ["Alice", "Bob"]
+
+    # Different ranges, so the second call reaches the API instead of the in-memory
+    # responses; each block of 30 hourly messages runs into the following day
+    first = analyzer.analyze_by_user_batch(chat, users, "2024-01-01", "2024-01-02")
+    second = analyzer.analyze_by_user_batch(chat, users, "2024-01-01", "2024-01-04")
+
+    for results, total in ((first, 30), (second, 60)):
+        assert list(results) == users
+        for result in results.values():
+            assert result["insights"] == "From the LLM"
+            assert result["total_messages"] == total
+
+
+def test_batch_keeps_the_shared_key_position(analyzer, chat):
+    analyzer.analyze_by_user_batch(chat, ["Alice", "Bob"], "2024-01-01", "2024-01-04")
+    assert analyzer.llm.current_key_index == 0
@@ -11,9 +11,14 @@ from collections import Counter
 from urlextract import URLExtract
 import emoji
 import os
+import re
 
 extract = URLExtract()
 
+# Text cleanup for the word cloud / most common words
+_MEDIA_RE = re.compile(r'<media\s+omitted>', re.IGNORECASE)
+_URL_RE = re.compile(r'http\S+|www\S+')
+
 import matplotlib.pyplot as plt
 plt.rcParams['font.sans-serif'] = ['DejaVu Sans', 'Noto Color Emoji']
 
@@ -93,10 +98,10 @@ def show(df):
         # Monthly Timeline
         st.subheader("📅 Activity Over Time")
         try:
-            timeline = display_df.groupby(['year', 'month_num', 'month']).size().reset_index(name='message')
+            timeline = display_df.groupby(['year', 'month_num', 'month'], observed=True).size().reset_index(name='message')
             
             if len(timeline) > 0:
-                time_labels = [f"{row['month']}-{row['year']}" for _, row in timeline.iterrows()]
+                time_labels = (timeline['month'].astype(str) + "-" + timeline['year'].astype(str)).tolist()
                 fig, ax = plt.subplots(figsize=(12, 4))
                 ax.plot(range(len(time_labels)), timeline['message'].values, marker='o', color='#1f77b4', linewidth=2)
                 ax.fill_between(range(len(time_labels)), timeline['message'].values, alpha=0.3, color='#1f77b4')
@@ -117,7 +122,7 @@ def show(df):
             
             with col1:
                 st.markdown("**Busiest Days**")
-                busy_day = display_df['day_name'].value_counts()
+                busy_day = display_df['day_name'].astype(str).value_counts()
                 if len(busy_day) > 0:
                     fig, ax = plt.subplots(figsize=(10, 4))
                     ax.bar(busy_day.index, busy_day.values, color='#2ca02c', alpha=0.7)
@@ -127,7 +132,7 @@ def show(df):
             
             with col2:
                 st.markdown("**Busiest Months**")
-                busy_month = display_df['month'].value_counts()
+                busy_month = display_df['month'].astype(str).value_counts()
                 if len(busy_month) > 0:
                     fig, ax = plt.subplots(figsize=(10, 4))
                     ax.bar(busy_month.index, busy_month.values, color='#ff7f0e', alpha=0.7)
@@ -180,10 +185,9 @@ def show(df):
                 stopwords = load_stopwords()
                 
                 # Clean text: remove URLs, media markers, and extra whitespace
-                import re
                 text = " ".join(wc_df['message'].astype(str))
-                text = re.sub(r'<media\s+omitted>', '', text, flags=re.IGNORECASE)
-                text = re.sub(r'http\S+|www\S+', '', text)
+                text = _MEDIA_RE.sub('', text)
+                text = _URL_RE.sub('', text)
                 text = re.sub(r'\s+', ' ', text)
                 
                 if text.strip():
@@ -207,18 +211,21 @@ def show(df):
             # Load stopwords
             stopwords = load_stopwords()
             
-            words_list = []
-            for idx, msg in display_df[display_df['user'] != 'group_notification']['message'].items():
-                # Remove URLs and media markers from message
-                msg_clean = str(msg).lower()
-                msg_clean = re.sub(r'<media\s+omitted>', '', msg_clean, flags=re.IGNORECASE)
-                msg_clean = re.sub(r'http\S+|www\S+', '', msg_clean)
-                words_list.extend(msg_clean.split())
+            is_stopword = stopwords.__contains__
             
-            # Remove stopwords and short words
-            words_list = [w for w in words_list if w not in stopwords and len(w) > 2 and not w.startswith('http') and not w.startswith('<')]
+            # Stream each message's words into the counter instead of building one big list
+            word_counts = Counter()
+            update = word_counts.update
+            for msg in display_df.loc[display_df['user'] != 'group_notification', 'message'].values:
+                # Remove URLs and media markers from message
+                msg_clean = _URL_RE.sub('', _MEDIA_RE.sub('', str(msg).lower()))
+                # Remove stopwords and short words
+                update(
+                    w for w in msg_clean.split()
+                    if len(w) > 2 and not is_stopword(w) and not w.startswith(('http', '<'))
+                )
             
-            most_common = Counter(words_list).most_common(20)
+            most_common = word_counts.most_common(20)
             
             if most_common:
                 words_df = pd.DataFrame(most_common, columns=['Word', 'Frequency'])
@@ -64,7 +64,7 @@ def show(df):
             return
         
         # User selection for "By User" analysis
-        selected_user = None
+        selected_users = []
         if analysis_type == "By User":
             user_list = df['user'].unique().tolist()
             if 'group_notification' in user_list:
@@ -72,7 +72,9 @@ def show(df):
             user_list.sort()
             
             if user_list:
-                selected_user = st.selectbox("Select user", user_list, key="sentiment_user_select")
+                selected_users = st.multiselect(
+                    "Select users", user_list, default=user_list[:1], key="sentiment_user_select"
+                )
             else:
                 st.warning("No users found")
                 return
@@ -84,14 +86,20 @@ def show(df):
                 analyzer = TimeBasedSentimentAnalyzer()
                 result = None
                 
+                user_results = None
+                
                 if analysis_type == "Overall":
                     result = analyzer.analyze_date_range(df, start_date, end_date)
                 
                 elif analysis_type == "By User":
-                    if selected_user:
-                        result = analyzer.analyze_by_user(df, selected_user, start_date, end_date)
-                        if result:
-                            result['analysis_type'] = f"User: {selected_user}"
+                    if selected_users:
+                        # Selected users are analyzed concurrently
+                        user_results = analyzer.analyze_by_user_batch(df, selected_users, start_date, end_date)
+                        for user, user_result in user_results.items():
+                            user_result['analysis_type'] = f"User: {user}"
+                        result = user_results[selected_users[0]]
+                    else:
+                        st.warning("Select at least one user")
                 
                 else:  # By Topic
                     st.info("💡 Topic-based sentiment will be shown after topic modeling")
@@ -99,6 +107,7 @@ def show(df):
                 
                 if result:
                     st.session_state.sentiment_result = result
+                    st.session_state.sentiment_user_results = user_results
             
             except Exception as e:
                 st.error(f"❌ Error analyzing sentiment: {str(e)[:150]}")
@@ -112,6 +121,25 @@ def show(df):
         st.markdown("---")
         st.header("📊 Sentiment Analysis Results")
         
+        # Several users: compare them, then show the details of one
+        user_results = st.session_state.get('sentiment_user_results')
+        if user_results and len(user_results) > 1:
+            st.subheader("👥 User Comparison")
+            comparison = pd.DataFrame([
+                {
+                    "User": user,
+                    "Positive": user_result.get('overall_sentiment', {}).get('positive', 0),
+                    "Neutral": user_result.get('overall_sentiment', {}).get('neutral', 0),
+                    "Negative": user_result.get('overall_sentiment', {}).get('negative', 0),
+                    "Messages": user_result.get('total_messages', 0),
+                }
+                for user, user_result in user_results.items()
+            ])
+            st.dataframe(comparison, width='stretch', hide_index=True)
+            
+            detail_user = st.selectbox("Show details for", list(user_results), key="sentiment_user_detail")
+            result = user_results[detail_user]
+        
         if 'error' not in result:
             # 1. Overall Metrics
             st.subheader("Overall Sentiment")
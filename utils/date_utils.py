@@ -26,8 +26,8 @@ def filter_df_by_date_range(
     df_copy = df.copy()
     df_copy['only_date'] = pd.to_datetime(df_copy['only_date'])
     
-    mask = (df_copy['only_date'].astype(str) >= start_date) & \
-           (df_copy['only_date'].astype(str) <= end_date)
+    mask = (df_copy['only_date'] >= pd.Timestamp(start_date)) & \
+           (df_copy['only_date'] <= pd.Timestamp(end_date))
     
     return df_copy[mask]
 